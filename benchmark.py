@@ -0,0 +1,340 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import typing
+
+import pandas as pd
+
+import player_index
+import utilities
+from correlation import (
+    NON_FEATURE_COLUMNS,
+    compute_correlations,
+    get_same_year_columns,
+    plot_correlation,
+)
+from sos_analysis import SOS_COLUMNS, is_sos_a_good_deciding_factor, save_sos_plots
+from synthetic_data import load_template, write_synthetic_data
+from utilities import clear_cache, get_master_df, split_by_position
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(__file__), "benchmarks")
+HISTORY_PATH = os.path.join(BENCHMARK_DIR, "history.json")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+SCALES = [1, 10, 100]
+YEAR = 24
+PPR = True
+# a result is a regression when it is this much slower or bigger than the baseline
+REGRESSION_THRESHOLD = 0.2
+# differences smaller than these are noise, not regressions
+MIN_SECONDS_DIFFERENCE = 0.01
+MIN_PEAK_MB_DIFFERENCE = 1.0
+
+
+def _copy_data_files(data_dir: str, year: int) -> None:
+    # master sheet and finish files of the year, the inputs of get_master_df
+    file_names = [f"master_sheet_{year}.csv"] + [
+        f"fp_converted_names_{scoring}_{year}.csv" for scoring in ["ppr", "standard"]
+    ]
+    os.makedirs(data_dir, exist_ok=True)
+    for file_name in file_names:
+        shutil.copy(os.path.join(utilities.DATA_DIR, file_name), data_dir)
+    shutil.copy(player_index.PLAYER_INDEX_PATH, data_dir)
+
+
+def _write_scaled_data(data_dir: str, year: int, scale: int, seed: int) -> None:
+    # synthetic league with scale times as many players as the real master sheet
+    players = len(load_template(year).cells) * scale
+    write_synthetic_data(data_dir, players, [year], seed=seed, template_year=year)
+
+
+@contextlib.contextmanager
+def use_data_dir(data_dir: str) -> typing.Iterator[None]:
+    # point the loaders and the player index at another data directory
+    saved = (utilities.DATA_DIR, utilities.CACHE_DIR, player_index.PLAYER_INDEX_PATH)
+    utilities.DATA_DIR = data_dir
+    utilities.CACHE_DIR = os.path.join(data_dir, "cache")
+    player_index.PLAYER_INDEX_PATH = os.path.join(data_dir, "player_ids.csv")
+    try:
+        yield
+    finally:
+        utilities.DATA_DIR, utilities.CACHE_DIR, player_index.PLAYER_INDEX_PATH = saved
+
+
+def get_correlation(df: pd.DataFrame, same_year: bool) -> pd.DataFrame:
+    # the original per position df.corr() pass, kept as the reference implementation
+    # that compute_correlations is measured against
+    if same_year:
+        df = df[get_same_year_columns(df.columns.tolist())]
+    correlation_df = (
+        df.drop(columns=NON_FEATURE_COLUMNS).corr().reset_index().melt(id_vars="index")
+    )
+    # only look for correlations with Final_PPG
+    if not same_year:
+        correlation_df = correlation_df[correlation_df["index"] == "Final_PPG"]
+        return correlation_df[correlation_df["variable"] != "Final_PPG"]
+    correlation_df = correlation_df[correlation_df["index"] == "AVG_FAN PTS"]
+    # drop rows where variable is AVG_FAN PTS or FAN_PTS
+    return correlation_df[
+        ~correlation_df["variable"].isin(["AVG_FAN PTS", "FAN PTS", "Final_PPG"])
+    ]
+
+
+def get_benchmarks(
+    year: int, ppr: bool, image_dir: str
+) -> typing.Dict[str, typing.Callable[[], object]]:
+    # entry points to time, inputs they share are prepared once up front
+    df = get_master_df(ppr=ppr, year=year)
+    position_dfs = {
+        position: pos_df
+        for position, pos_df in split_by_position(df).items()
+        if position != "UNKNOWN"
+    }
+
+    def load_uncached() -> pd.DataFrame:
+        clear_cache()
+        return get_master_df(ppr=ppr, year=year)
+
+    def correlate_positions() -> None:
+        for pos_df in position_dfs.values():
+            get_correlation(pos_df, same_year=False)
+
+    def compare_sos() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for pos_df in position_dfs.values():
+                is_sos_a_good_deciding_factor(pos_df, show_comparisons=False)
+
+    correlation_df = compute_correlations([year])
+    final_ppg_df = correlation_df[
+        (correlation_df["ppr"] == ppr)
+        & ~correlation_df["same_year"]
+        & ~correlation_df["starters_only"]
+        & ~correlation_df["drop_rookies"]
+    ]
+
+    def plot_correlations() -> None:
+        # plot_correlation saves relative to the working directory
+        current_dir = os.getcwd()
+        os.chdir(image_dir)
+        try:
+            for position, variant_df in final_ppg_df.groupby("position"):
+                plot_correlation(variant_df, position, False, year, ppr, False, False)
+        finally:
+            os.chdir(current_dir)
+
+    def save_sos() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            save_sos_plots(position_dfs, image_dir, "png", jobs=1)
+
+    return {
+        "get_master_df_uncached": load_uncached,
+        "get_master_df_cached": lambda: get_master_df(ppr=ppr, year=year),
+        "get_master_df_sos_columns": lambda: get_master_df(
+            ppr=ppr, year=year, use_cache=False, columns=SOS_COLUMNS
+        ),
+        "split_by_position": lambda: split_by_position(df),
+        "get_correlation": correlate_positions,
+        "compute_correlations": lambda: compute_correlations([year]),
+        "is_sos_a_good_deciding_factor": compare_sos,
+        "plot_correlation": plot_correlations,
+        "save_sos_plots": save_sos,
+    }
+
+
+def measure(
+    function: typing.Callable[[], object], repeats: int
+) -> typing.Dict[str, float]:
+    # best wall time of a few runs, then one more run under tracemalloc for peak memory
+    # (tracemalloc slows everything down, so it is kept out of the timed runs)
+    function()
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(seconds), "peak_mb": peak / 2**20}
+
+
+def run_benchmarks(
+    scales: typing.List[int],
+    repeats: int,
+    names: typing.Optional[typing.List[str]] = None,
+    year: int = YEAR,
+    ppr: bool = PPR,
+    seed: int = 0,
+) -> typing.Dict[str, typing.Dict[str, float]]:
+    # scale 1 is a copy of the checked in data, larger scales are synthetic
+    results = {}
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_dir = os.path.join(tmp_dir, "data")
+            image_dir = os.path.join(tmp_dir, "images")
+            os.makedirs(image_dir)
+            if scale == 1:
+                _copy_data_files(data_dir, year)
+            else:
+                _write_scaled_data(data_dir, year, scale, seed)
+
+            with use_data_dir(data_dir):
+                # synthetic players need ids before anything can be loaded
+                player_index.build_player_index()
+                benchmarks = get_benchmarks(year, ppr, image_dir)
+                for name, function in benchmarks.items():
+                    if names and name not in names:
+                        continue
+                    key = f"{name}[x{scale}]"
+                    results[key] = measure(function, repeats)
+                    print(
+                        f"{key:<45} {results[key]['seconds']:>9.4f}s "
+                        f"{results[key]['peak_mb']:>9.1f} MB"
+                    )
+    return results
+
+
+def _get_git_commit() -> typing.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _load_json(path: str, default: typing.Any) -> typing.Any:
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_json(path: str, data: typing.Any) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def find_regressions(
+    results: typing.Dict[str, typing.Dict[str, float]],
+    baseline: typing.Dict[str, typing.Dict[str, float]],
+    threshold: float = REGRESSION_THRESHOLD,
+) -> typing.List[str]:
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        seconds_difference = result["seconds"] - base["seconds"]
+        if (
+            result["seconds"] > base["seconds"] * (1 + threshold)
+            and seconds_difference > MIN_SECONDS_DIFFERENCE
+        ):
+            regressions.append(
+                f"{key}: {result['seconds']:.4f}s vs {base['seconds']:.4f}s baseline"
+            )
+        peak_mb_difference = result["peak_mb"] - base["peak_mb"]
+        if (
+            result["peak_mb"] > base["peak_mb"] * (1 + threshold)
+            and peak_mb_difference > MIN_PEAK_MB_DIFFERENCE
+        ):
+            regressions.append(
+                f"{key}: {result['peak_mb']:.1f} MB vs {base['peak_mb']:.1f} MB baseline"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time the data loading and analysis hot paths on real and "
+        "scaled up data."
+    )
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=SCALES,
+        help="Player count multipliers, 1 is the checked in data and larger scales "
+        "are synthetic leagues",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the synthetic leagues"
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--only", nargs="+", help="Only run the benchmarks with these names"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        help="Fraction slower or bigger than the baseline that counts as a regression",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store these results as the baseline for later runs",
+    )
+    parser.add_argument(
+        "--no-history",
+        action="store_true",
+        help="Don't append these results to the history file",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scales, args.repeats, args.only, seed=args.seed)
+
+    if not args.no_history:
+        history = _load_json(HISTORY_PATH, [])
+        history.append(
+            {
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "commit": _get_git_commit(),
+                "python": platform.python_version(),
+                "results": results,
+            }
+        )
+        _save_json(HISTORY_PATH, history)
+
+    if args.save_baseline:
+        # keep baseline entries of benchmarks that weren't run this time
+        baseline = _load_json(BASELINE_PATH, {})
+        baseline.update(results)
+        _save_json(BASELINE_PATH, baseline)
+        print(f"Saved {len(results)} results as the baseline")
+        return
+
+    baseline = _load_json(BASELINE_PATH, {})
+    if not baseline:
+        print("No baseline yet, run with --save-baseline to store one")
+        return
+    regressions = find_regressions(results, baseline, args.threshold)
+    if regressions:
+        print("Regressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        raise SystemExit(1)
+    print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# the modules live at the top level of the repo, this file puts it on the test path
@@ -1,20 +1,24 @@
+import argparse
+import glob
+import os
+import re
+import typing
+
 import pandas as pd
-from FootballNameMatcher import match_name
 
-PPR = True
-PPR_STRING = "_ppr" if PPR else "_standard"
-YEAR = 23
-YEAR_STRING = f"_{YEAR:02d}"
+from name_matching import get_aliases, match_names
+
+FP_FILE_PATTERN = re.compile(
+    r"FantasyPros_Fantasy_Football_Points_(?P<scoring>ppr|standard)_(?P<year>\d{2})\.csv"
+)
 
 
 def get_df(file_path: str) -> pd.DataFrame:
     return pd.read_csv(file_path)
 
 
-def convert_fp_names(df: pd.DataFrame) -> pd.DataFrame:
-    df["Player"] = df["Player"].apply(
-        lambda x: match_name(x, force_last_name_match=True)
-    )
+def convert_fp_names(df: pd.DataFrame, jobs: int = 1) -> pd.DataFrame:
+    df["Player"] = match_names(df["Player"], jobs)
     return df
 
 
@@ -22,13 +26,62 @@ def remove_rows_with_no_name(df: pd.DataFrame) -> pd.DataFrame:
     return df[df["Player"].notna()]
 
 
-def main():
-    df = get_df(
-        f"data/FantasyPros_Fantasy_Football_Points{PPR_STRING}{YEAR_STRING}.csv"
+def get_fp_files(
+    years: typing.Optional[typing.List[int]], scoring: typing.List[str]
+) -> typing.List[typing.Tuple[str, str, str]]:
+    # (file path, scoring string, year string) for every FantasyPros file that matches
+    fp_files = []
+    for file_path in sorted(
+        glob.glob("data/FantasyPros_Fantasy_Football_Points_*.csv")
+    ):
+        match = FP_FILE_PATTERN.fullmatch(os.path.basename(file_path))
+        if match is None or match["scoring"] not in scoring:
+            continue
+        if years is not None and int(match["year"]) not in years:
+            continue
+        fp_files.append((file_path, match["scoring"], match["year"]))
+    return fp_files
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--years", type=int, nargs="+", help="Two digit years (default: all)"
+    )
+    parser.add_argument(
+        "--scoring",
+        nargs="+",
+        choices=["ppr", "standard"],
+        default=["ppr", "standard"],
+    )
+    parser.add_argument("--jobs", type=int, default=1)
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    fp_files = get_fp_files(args.years, args.scoring)
+    if not fp_files:
+        parser.error(
+            "no FantasyPros points files in data/ match the given years and scoring"
+        )
+    dfs = [get_df(file_path) for file_path, _, _ in fp_files]
+    # match every name across all files in one batch, later lookups hit the cache
+    get_aliases(
+        pd.concat([df["Player"] for df in dfs]).dropna().unique(), jobs=args.jobs
+    )
+
+    for (file_path, scoring, year), df in zip(fp_files, dfs):
+        df = convert_fp_names(df)
+        df = remove_rows_with_no_name(df)
+        output_path = f"data/fp_converted_names_{scoring}_{year}.csv"
+        df.to_csv(output_path, index=False)
+        print(f"Converted {file_path} -> {output_path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Convert FantasyPros player names to the master sheet names."
     )
-    df = convert_fp_names(df)
-    df = remove_rows_with_no_name(df)
-    df.to_csv(f"data/fp_converted_names{PPR_STRING}{YEAR_STRING}.csv", index=False)
+    add_arguments(parser)
+    run(parser.parse_args(), parser)
 
 
 if __name__ == "__main__":
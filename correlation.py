@@ -1,60 +1,106 @@
+import argparse
+import hashlib
+import itertools
+import json
 import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
-from utilities import get_master_df, split_by_position
+from correlation_engine import (
+    CORRELATION_METHODS,
+    bootstrap_pearson_ci,
+    correlation_matrix,
+    cutoff_pearson,
+)
+from instrumentation import enable_profiling, stage
+from utilities import (
+    STACK_KEYS,
+    get_finish_rows,
+    get_master_df,
+    get_stacked_df,
+    split_by_position,
+)
+from weekly_points import WEEKS, get_weekly_points, get_window_ppg
 
 YEARS = [25, 24, 23]
+NON_FEATURE_COLUMNS = ["PLAYER_ID", "PLAYER NAME", "POS", "TEAM"]
+# bump whenever plot_correlation changes so every chart is rendered again
+PLOT_VERSION = 1
+MANIFEST_PATH = os.path.join("images", "correlation", "manifest.json")
+ROLLING_WINDOW_WEEKS = 4
+BOOTSTRAP_CONFIDENCE = 0.95
+# partial correlations control for these columns unless others are given
+DEFAULT_COVARIATES = ["ADP"]
+# year of correlations computed over every season at once
+POOLED_YEAR = "pooled"
+# cutoff curves start at the top MIN_CUTOFF players and show the CURVE_FEATURES
+# features that correlate best at the starters cutoff
+MIN_CUTOFF = 8
+CURVE_FEATURES = 8
+VARIANT_COLUMNS = [
+    "year",
+    "ppr",
+    "starters_only",
+    "drop_rookies",
+    "same_year",
+    "position",
+]
+NEXT_YEAR_BASED_VARIABLES = [
+    "RK",
+    "STD",
+    "BOOM",
+    "BUST",
+    "START",
+    "SOS",
+    "DEPTH",
+    "BEST",
+    "WORST",
+    "TIER",
+    "ADP",
+    "POS_AVG.",
+]
 
 
-def drop_next_year_based_stats(df: pd.DataFrame) -> pd.DataFrame:
-    all_cols = df.columns.tolist()
-    bad_variables = [
-        "RK",
-        "STD",
-        "BOOM",
-        "BUST",
-        "START",
-        "SOS",
-        "DEPTH",
-        "BEST",
-        "WORST",
-        "TIER",
-        "ADP",
-        "POS_AVG.",
+def get_same_year_columns(columns: typing.List[str]) -> typing.List[str]:
+    # drop columns that contain any of the next year based variables
+    return [
+        col
+        for col in columns
+        if not any(var in col for var in NEXT_YEAR_BASED_VARIABLES)
     ]
-    # drop columns that contain any of the bad variables
-    for var in bad_variables:
-        all_cols = [col for col in all_cols if var not in col]
 
-    return df[all_cols].reset_index(drop=True)
 
-
-def get_correlation(df: pd.DataFrame, same_year: bool) -> pd.DataFrame:
-    # drop PLAYER NAME and POS columns
-    df = df.drop(columns=["PLAYER NAME", "POS", "TEAM"])
-    # calculate the correlation matrix
-    correlation_matrix = df.corr()
-    # convert the correlation matrix to a DataFrame
-    correlation_df = correlation_matrix.reset_index().melt(id_vars="index")
-    # only look for correlations with Final_PPG
-    if not same_year:
-        correlation_df = correlation_df[correlation_df["index"] == "Final_PPG"]
-        correlation_df = correlation_df[correlation_df["variable"] != "Final_PPG"]
-    else:
-        correlation_df = correlation_df[correlation_df["index"] == "AVG_FAN PTS"]
-        # drop rows where variable is AVG_FAN PTS or FAN_PTS
-        correlation_df = correlation_df[
-            (correlation_df["variable"] != "AVG_FAN PTS")
-            & (correlation_df["variable"] != "FAN PTS")
-            & (correlation_df["variable"] != "Final_PPG")
-        ]
-
-    assert isinstance(correlation_df, pd.DataFrame)
-
-    return correlation_df
+def get_correlation_image_path(
+    position: str,
+    same_year: bool,
+    year: int,
+    ppr: bool,
+    starters_only: bool,
+    should_drop_rookies: bool,
+    window: typing.Optional[str] = None,
+    method: str = "pearson",
+) -> str:
+    ppg_string = "same_year" if same_year else "final_ppg"
+    if window is not None:
+        ppg_string = window
+    if method != "pearson":
+        ppg_string = f"{ppg_string}_{method}"
+    rookies_str = "drop_rookies" if should_drop_rookies else "keep_rookies"
+    starters_str = "top_ranked" if starters_only else "all_players"
+    player_string = f"{rookies_str}_{starters_str}"
+    ppr_string = "ppr" if ppr else "standard"
+    return os.path.join(
+        "images",
+        "correlation",
+        str(year),
+        ppr_string,
+        ppg_string,
+        player_string,
+        f"{position}.png",
+    )
 
 
 def plot_correlation(
@@ -65,41 +111,267 @@ def plot_correlation(
     ppr: bool,
     starters_only: bool,
     should_drop_rookies: bool,
+    window: typing.Optional[str] = None,
+    method: str = "pearson",
 ) -> None:
+    # matplotlib is imported by the plotting functions only, so data only imports of
+    # this module stay fast
+    from matplotlib.figure import Figure
+
     # drop nan values
-    correlation_df = correlation_df.dropna()
+    correlation_df = correlation_df.dropna(subset=["value"])
     # duplicate value column but make it absolute
     correlation_df = correlation_df.copy()
     correlation_df["abs_value"] = correlation_df["value"].abs()
     # sort by value
     correlation_df = correlation_df.sort_values(by="abs_value", ascending=False)
-    plt.figure(figsize=(14, 6))
+    # use the object oriented api so figures can be rendered from worker processes
+    fig = Figure(figsize=(14, 6))
+    ax = fig.add_subplot()
     bar_heights = np.abs(correlation_df["value"])
     colors = ["green" if val >= 0 else "red" for val in correlation_df["value"]]
-    plt.bar(correlation_df["variable"], bar_heights, color=colors)
-    plt.xticks(rotation=90)
-    plt.xlabel("Variables")
-    plt.ylabel("Correlation Coefficient")
-    plt.tight_layout()
+    error_bars = None
+    if "ci_low" in correlation_df.columns:
+        # bars show the absolute correlation, so flip the interval of negative ones
+        negative = correlation_df["value"] < 0
+        ci_low = np.where(
+            negative, -correlation_df["ci_high"], correlation_df["ci_low"]
+        )
+        ci_high = np.where(
+            negative, -correlation_df["ci_low"], correlation_df["ci_high"]
+        )
+        error_bars = np.vstack(
+            [
+                (bar_heights - ci_low).clip(lower=0),
+                (ci_high - bar_heights).clip(lower=0),
+            ]
+        )
+    ax.bar(
+        correlation_df["variable"],
+        bar_heights,
+        color=colors,
+        yerr=error_bars,
+        ecolor="black",
+        capsize=2,
+    )
+    ax.tick_params(axis="x", labelrotation=90)
+    ax.set_xlabel("Variables")
+    ax.set_ylabel("Correlation Coefficient")
     # set the y-axis limits to -1 and 1
-    plt.ylim(0, 1)
+    ax.set_ylim(0, 1)
     same_year_str = "Same Year Points" if same_year else "Final PPG"
-    plt.title(f"{position} Correlation with {same_year_str}")
+    if window is not None:
+        # window names end with their first and last week
+        start, end = window.split("_")[-2:]
+        same_year_str = f"PPG Weeks {start}-{end}"
+    method_str = "" if method == "pearson" else f"{method.capitalize()} "
+    ax.set_title(f"{position} {method_str}Correlation with {same_year_str}")
     # save image
+    image_path = get_correlation_image_path(
+        position,
+        same_year,
+        year,
+        ppr,
+        starters_only,
+        should_drop_rookies,
+        window,
+        method,
+    )
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    with stage("savefig"):
+        fig.tight_layout()
+        fig.savefig(image_path)
+
+
+def _plot_correlation_task(task: typing.Tuple[pd.DataFrame, dict]) -> None:
+    variant_df, plot_kwargs = task
+    plot_correlation(variant_df, **plot_kwargs)
+
+
+def _get_chart_hash(variant_df: pd.DataFrame, plot_kwargs: dict) -> str:
+    # content hash of everything that ends up in the chart
+    hasher = hashlib.sha256(f"plot_v{PLOT_VERSION}".encode())
+    hasher.update(json.dumps(plot_kwargs, sort_keys=True, default=str).encode())
+    hasher.update("\0".join(variant_df["variable"]).encode())
+    for column in ["value", "ci_low", "ci_high"]:
+        if column in variant_df.columns:
+            hasher.update(variant_df[column].to_numpy(dtype=np.float64).tobytes())
+    return hasher.hexdigest()
+
+
+def _load_manifest() -> typing.Dict[str, str]:
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest: typing.Dict[str, str]) -> None:
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def render_correlation_charts(
+    correlation_df: pd.DataFrame, jobs: int, force: bool = False
+) -> None:
+    # one chart per variant and position, rendered across a process pool
+    # charts whose inputs match the manifest are skipped unless force is set
+    manifest = _load_manifest()
+    tasks = []
+    rendered_hashes = {}
+    skipped = 0
+    # window correlations have a window column in place of same_year
+    group_columns = [
+        col
+        for col in VARIANT_COLUMNS + ["window", "method"]
+        if col in correlation_df.columns
+    ]
+    for keys, variant_df in correlation_df.groupby(group_columns, sort=False):
+        variant = dict(zip(group_columns, keys))
+        plot_kwargs = {
+            "position": variant["position"],
+            "same_year": variant.get("same_year", False),
+            "year": variant["year"],
+            "ppr": variant["ppr"],
+            "starters_only": variant["starters_only"],
+            "should_drop_rookies": variant["drop_rookies"],
+        }
+        if "window" in variant:
+            plot_kwargs["window"] = variant["window"]
+        if variant.get("method", "pearson") != "pearson":
+            plot_kwargs["method"] = variant["method"]
+        variant_df = variant_df[
+            [
+                col
+                for col in ["variable", "value", "ci_low", "ci_high"]
+                if col in variant_df.columns
+            ]
+        ]
+        image_path = get_correlation_image_path(**plot_kwargs)
+        chart_hash = _get_chart_hash(variant_df, plot_kwargs)
+        if (
+            not force
+            and manifest.get(image_path) == chart_hash
+            and os.path.exists(image_path)
+        ):
+            skipped += 1
+            continue
+        tasks.append((variant_df, plot_kwargs))
+        rendered_hashes[image_path] = chart_hash
+
+    print(f"Rendering {len(tasks)} charts, skipping {skipped} unchanged charts")
+    with stage("render_correlation_charts") as timed:
+        timed.set_shape(tasks)
+        if jobs == 1:
+            for task in tasks:
+                _plot_correlation_task(task)
+        elif tasks:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                # consume the iterator so worker exceptions are raised here
+                list(executor.map(_plot_correlation_task, tasks, chunksize=4))
+
+    manifest.update(rendered_hashes)
+    _save_manifest(manifest)
+
+
+def get_cutoff_image_path(
+    position: str,
+    same_year: bool,
+    year: int,
+    ppr: bool,
+    should_drop_rookies: bool,
+) -> str:
     ppg_string = "same_year" if same_year else "final_ppg"
     rookies_str = "drop_rookies" if should_drop_rookies else "keep_rookies"
-    starters_str = "top_ranked" if starters_only else "all_players"
-    player_string = f"{rookies_str}_{starters_str}"
     ppr_string = "ppr" if ppr else "standard"
-    os.makedirs(
-        f"images/correlation/{year}/{ppr_string}/{ppg_string}/{player_string}",
-        exist_ok=True,
+    return os.path.join(
+        "images",
+        "correlation",
+        str(year),
+        ppr_string,
+        ppg_string,
+        f"{rookies_str}_cutoffs",
+        f"{position}.png",
+    )
+
+
+def plot_cutoff_curves(
+    curve_df: pd.DataFrame,
+    position: str,
+    same_year: bool,
+    year: int,
+    ppr: bool,
+    should_drop_rookies: bool,
+    feature_count: int = CURVE_FEATURES,
+) -> None:
+    # correlation of the strongest features against the number of top ranked players kept
+    from matplotlib.figure import Figure
+
+    starters = min(get_starters_count(position), curve_df["cutoff"].max())
+    at_starters = curve_df[curve_df["cutoff"] == starters].dropna(subset=["value"])
+    top_features = (
+        at_starters.assign(abs_value=at_starters["value"].abs())
+        .nlargest(feature_count, "abs_value")["variable"]
+        .tolist()
     )
-    plt.tight_layout()
-    plt.savefig(
-        f"images/correlation/{year}/{ppr_string}/{ppg_string}/{player_string}/{position}.png"
+    fig = Figure(figsize=(14, 6))
+    ax = fig.add_subplot()
+    for variable in top_features:
+        feature_df = curve_df[curve_df["variable"] == variable]
+        ax.plot(feature_df["cutoff"], feature_df["value"], label=variable)
+    ax.axvline(starters, color="gray", linestyle="--", linewidth=1)
+    ax.axhline(0, color="black", linewidth=0.5)
+    ax.set_xlabel(f"Top N {position}s by POS_RK")
+    ax.set_ylabel("Correlation Coefficient")
+    ax.set_ylim(-1, 1)
+    ax.legend(loc="lower left", ncol=2)
+    same_year_str = "Same Year Points" if same_year else "Final PPG"
+    ax.set_title(f"{position} Correlation with {same_year_str} by Cutoff")
+    image_path = get_cutoff_image_path(
+        position, same_year, year, ppr, should_drop_rookies
     )
-    plt.close()
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    with stage("savefig"):
+        fig.tight_layout()
+        fig.savefig(image_path)
+
+
+def _plot_cutoff_curves_task(task: typing.Tuple[pd.DataFrame, dict]) -> None:
+    curve_df, plot_kwargs = task
+    plot_cutoff_curves(curve_df, **plot_kwargs)
+
+
+def render_cutoff_charts(
+    curve_df: pd.DataFrame, jobs: int, feature_count: int = CURVE_FEATURES
+) -> None:
+    # one chart of curves per variant and position, rendered across a process pool
+    tasks = []
+    group_columns = ["year", "ppr", "drop_rookies", "same_year", "position"]
+    for keys, variant_df in curve_df.groupby(group_columns, sort=False):
+        variant = dict(zip(group_columns, keys))
+        plot_kwargs = {
+            "position": variant["position"],
+            "same_year": variant["same_year"],
+            "year": variant["year"],
+            "ppr": variant["ppr"],
+            "should_drop_rookies": variant["drop_rookies"],
+            "feature_count": feature_count,
+        }
+        tasks.append((variant_df[["cutoff", "variable", "value"]], plot_kwargs))
+
+    print(f"Rendering {len(tasks)} cutoff charts")
+    with stage("render_cutoff_charts") as timed:
+        timed.set_shape(tasks)
+        if jobs == 1:
+            for task in tasks:
+                _plot_cutoff_curves_task(task)
+        elif tasks:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                # consume the iterator so worker exceptions are raised here
+                list(executor.map(_plot_cutoff_curves_task, tasks, chunksize=4))
 
 
 def random_corrections(df: pd.DataFrame) -> pd.DataFrame:
@@ -113,71 +385,480 @@ def random_corrections(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def keep_top_n_players(df: pd.DataFrame, n: int) -> pd.DataFrame:
-    # keep only the top n players based on POS_RK
-    top_players = df.nsmallest(n, "POS_RK")
-    return top_players.reset_index(drop=True)
+def get_starters_count(position: str) -> int:
+    # keep only the top 32 players unless it's a WR, then keep top 64
+    return 64 if position == "WR" else 32
 
 
-def drop_rookies(df: pd.DataFrame) -> pd.DataFrame:
-    # if AVG_FAN PTS is 0, then it's a rookie
-    df = df[df["AVG_FAN PTS"] != 0]  # type: ignore
-    return df.reset_index(drop=True)
+def _get_target_and_features(
+    columns: typing.List[str], same_year: bool
+) -> typing.Tuple[str, typing.List[str]]:
+    # Final_PPG against everything else, or this season's stats against AVG_FAN PTS
+    if not same_year:
+        return "Final_PPG", [col for col in columns if col != "Final_PPG"]
+    columns = get_same_year_columns(columns)
+    excluded = ["AVG_FAN PTS", "FAN PTS", "Final_PPG"]
+    return "AVG_FAN PTS", [col for col in columns if col not in excluded]
 
 
-def process_sample(
-    year: int,
-    ppr: bool,
-    starters_only: bool,
-    should_drop_rookies: bool,
-    same_year_points: bool,
-) -> None:
-    df = get_master_df(ppr=ppr, year=year)
+def _get_method_inputs(
+    columns: typing.List[str],
+    features: typing.List[str],
+    method: str,
+    covariates: typing.Optional[typing.List[str]],
+) -> typing.Optional[typing.Tuple[typing.List[str], typing.List[int]]]:
+    # features to correlate and covariate column indices, None if a covariate is missing
+    if method != "partial":
+        return features, []
+    covariates = DEFAULT_COVARIATES if covariates is None else covariates
+    if any(col not in columns for col in covariates):
+        return None
+    # a covariate has nothing left to correlate once it is controlled for
+    features = [col for col in features if col not in covariates]
+    return features, [columns.index(col) for col in covariates]
+
+
+def _get_variant_mask(
+    pos_df: pd.DataFrame, position: str, starters_only: bool, should_drop_rookies: bool
+) -> np.ndarray:
+    # boolean row mask of the top ranked starters and of the players with a prior season
+    mask = np.ones(len(pos_df), dtype=bool)
+    if starters_only:
+        top_ranked = pos_df["POS_RK"].nsmallest(get_starters_count(position)).index
+        mask &= pos_df.index.isin(top_ranked)
+    if should_drop_rookies:
+        # if AVG_FAN PTS is 0, then it's a rookie
+        mask &= pos_df["AVG_FAN PTS"].to_numpy() != 0
+    return mask
+
+
+def _correlate_variant(
+    rows: np.ndarray,
+    columns: typing.List[str],
+    same_year: bool,
+    method: str,
+    covariates: typing.Optional[typing.List[str]],
+    bootstrap_resamples: int,
+    seed: int,
+    jobs: int,
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    # correlation table columns of every feature with the target over the given rows,
+    # None when the rows have no target or are missing a covariate
+    if not same_year and "Final_PPG" not in columns:
+        return None  # don't have final_ppg for this year yet
+    target, features = _get_target_and_features(columns, same_year)
+    method_inputs = _get_method_inputs(columns, features, method, covariates)
+    if method_inputs is None:
+        return None
+    features, covariate_idx = method_inputs
+    feature_values = rows[:, [columns.index(col) for col in features]]
+    target_values = rows[:, columns.index(target)]
+    with stage("correlation_matrix") as timed:
+        correlation = correlation_matrix(
+            feature_values, target_values, method, rows[:, covariate_idx]
+        )[:, 0]
+        timed.set_shape(feature_values)
+    result = {"method": method, "variable": features, "value": correlation}
+    if bootstrap_resamples > 0:
+        with stage("bootstrap_pearson_ci") as timed:
+            result["ci_low"], result["ci_high"] = bootstrap_pearson_ci(
+                feature_values,
+                target_values,
+                n_resamples=bootstrap_resamples,
+                confidence=BOOTSTRAP_CONFIDENCE,
+                seed=seed,
+                jobs=jobs,
+            )
+            timed.set_shape(feature_values)
+    return result
+
+
+def compute_correlations(
+    years: typing.List[int] = YEARS,
+    method: str = "pearson",
+    covariates: typing.Optional[typing.List[str]] = None,
+    bootstrap_resamples: int = 0,
+    seed: int = 0,
+    jobs: int = 1,
+) -> pd.DataFrame:
+    # loads each (year, ppr) frame once and correlates every variant from boolean row masks
+    # with bootstrap_resamples > 0 every correlation also gets a confidence interval
+    # partial correlations skip years that don't have every covariate (no ADP in 23)
+    results = []
+    for year in years:
+        for ppr in [True, False]:
+            df = get_master_df(ppr=ppr, year=year)
+            random_corrections(df)
+            for pos, pos_df in split_by_position(df).items():
+                if pos == "UNKNOWN":
+                    continue
+                numeric_df = pos_df.drop(columns=NON_FEATURE_COLUMNS)
+                columns = numeric_df.columns.tolist()
+                values = numeric_df.to_numpy(dtype=np.float64)
+
+                for starters_only, should_drop_rookies, same_year in itertools.product(
+                    [True, False], repeat=3
+                ):
+                    mask = _get_variant_mask(
+                        pos_df, pos, starters_only, should_drop_rookies
+                    )
+                    result = _correlate_variant(
+                        values[mask],
+                        columns,
+                        same_year,
+                        method,
+                        covariates,
+                        bootstrap_resamples,
+                        seed,
+                        jobs,
+                    )
+                    if result is None:
+                        continue
+                    variant = {
+                        "year": year,
+                        "ppr": ppr,
+                        "starters_only": starters_only,
+                        "drop_rookies": should_drop_rookies,
+                        "same_year": same_year,
+                        "position": pos,
+                    }
+                    results.append(pd.DataFrame({**variant, **result}))
+
+    return pd.concat(results, ignore_index=True)
+
+
+def compute_pooled_correlations(
+    years: typing.List[int] = YEARS,
+    method: str = "pearson",
+    covariates: typing.Optional[typing.List[str]] = None,
+    bootstrap_resamples: int = 0,
+    seed: int = 0,
+    jobs: int = 1,
+) -> pd.DataFrame:
+    # every season in one stacked frame, each scoring type and position is correlated
+    # once over the rows of all seasons. The year column of the result is POOLED_YEAR
+    df = get_stacked_df(years=years)
     random_corrections(df)
-    position_dfs = split_by_position(df)
+    # starters and rookies are still picked within each season
+    starter_rank = df.groupby(STACK_KEYS, observed=True)["POS_RK"].rank(method="first")
+    is_starter = (
+        starter_rank <= df["POS"].astype(str).map(get_starters_count)
+    ).to_numpy()
+    is_rookie = (df["AVG_FAN PTS"] == 0).to_numpy()
+    # columns that none of the selected seasons have are left out
+    numeric_df = df.drop(columns=NON_FEATURE_COLUMNS + ["year", "scoring"])
+    numeric_df = numeric_df.dropna(axis=1, how="all")
+    columns = numeric_df.columns.tolist()
+    values = numeric_df.to_numpy(dtype=np.float64)
 
-    for pos, df in position_dfs.items():
+    results = []
+    groups = df.groupby(["scoring", "POS"], observed=True).indices
+    for (scoring, pos), group_rows in groups.items():
         if pos == "UNKNOWN":
             continue
-        print(f"Position: {pos}")
-        # keep only the top 32 players unless it's a WR, then keep top 64
-        if starters_only:
-            if pos == "WR":
-                df = keep_top_n_players(df, 64)
-            else:
-                df = keep_top_n_players(df, 32)
-        if drop_rookies:
-            df = drop_rookies(df)
-        if same_year_points:
-            df = drop_next_year_based_stats(df)
-
-        correlation_df = get_correlation(df, same_year_points)
-        plot_correlation(
-            correlation_df,
-            pos,
-            same_year=same_year_points,
-            year=year,
-            ppr=ppr,
-            starters_only=starters_only,
-            should_drop_rookies=should_drop_rookies,
-        )
+        for starters_only, should_drop_rookies, same_year in itertools.product(
+            [True, False], repeat=3
+        ):
+            mask = np.ones(len(group_rows), dtype=bool)
+            if starters_only:
+                mask &= is_starter[group_rows]
+            if should_drop_rookies:
+                mask &= ~is_rookie[group_rows]
+            result = _correlate_variant(
+                values[group_rows[mask]],
+                columns,
+                same_year,
+                method,
+                covariates,
+                bootstrap_resamples,
+                seed,
+                jobs,
+            )
+            if result is None:
+                continue
+            variant = {
+                "year": POOLED_YEAR,
+                "ppr": scoring == "ppr",
+                "starters_only": starters_only,
+                "drop_rookies": should_drop_rookies,
+                "same_year": same_year,
+                "position": pos,
+            }
+            results.append(pd.DataFrame({**variant, **result}))
 
+    return pd.concat(results, ignore_index=True)
 
-def main() -> None:
-    for year in YEARS:
+
+def compute_cutoff_correlations(
+    years: typing.List[int] = YEARS, min_cutoff: int = MIN_CUTOFF
+) -> pd.DataFrame:
+    # correlation of every feature with the target over the top N players by POS_RK,
+    # for every N from min_cutoff to the whole position. Each position is sorted by
+    # rank once and every cutoff comes from the same running sums
+    results = []
+    for year in years:
         for ppr in [True, False]:
-            for starters_only in [True, False]:
-                for should_drop_rookies in [True, False]:
-                    for same_year_points in [True, False]:
-                        if not same_year_points and year == 25:
-                            continue  # don't have final_ppg for year 25 yet
-                        process_sample(
-                            year,
-                            ppr,
-                            starters_only,
-                            should_drop_rookies,
-                            same_year_points,
+            df = get_master_df(ppr=ppr, year=year)
+            random_corrections(df)
+            for pos, pos_df in split_by_position(df).items():
+                if pos == "UNKNOWN":
+                    continue
+                # same order as the starters mask, unranked players are never kept
+                ranked_df = pos_df.dropna(subset=["POS_RK"]).sort_values(
+                    by="POS_RK", kind="stable"
+                )
+                if len(ranked_df) < min_cutoff:
+                    continue
+                numeric_df = ranked_df.drop(columns=NON_FEATURE_COLUMNS)
+                columns = numeric_df.columns.tolist()
+                values = numeric_df.to_numpy(dtype=np.float64)
+                is_rookie = ranked_df["AVG_FAN PTS"].to_numpy() == 0
+                cutoffs = np.arange(min_cutoff, len(ranked_df) + 1)
+
+                for should_drop_rookies, same_year in itertools.product(
+                    [True, False], repeat=2
+                ):
+                    if not same_year and "Final_PPG" not in columns:
+                        continue  # don't have final_ppg for this year yet
+                    target, features = _get_target_and_features(columns, same_year)
+                    target_values = values[:, columns.index(target)]
+                    if should_drop_rookies:
+                        # rookies keep their place in the ranking but drop out of the sums
+                        target_values = np.where(is_rookie, np.nan, target_values)
+                    feature_values = values[:, [columns.index(col) for col in features]]
+                    with stage("cutoff_pearson") as timed:
+                        correlation = cutoff_pearson(
+                            feature_values, target_values, cutoffs
                         )
+                        timed.set_shape(feature_values)
+                    results.append(
+                        pd.DataFrame(
+                            {
+                                "year": year,
+                                "ppr": ppr,
+                                "drop_rookies": should_drop_rookies,
+                                "same_year": same_year,
+                                "position": pos,
+                                "cutoff": np.repeat(cutoffs, len(features)),
+                                "variable": np.tile(features, len(cutoffs)),
+                                "value": correlation.ravel(),
+                            }
+                        )
+                    )
+
+    return pd.concat(results, ignore_index=True)
+
+
+def get_week_windows(
+    rolling_weeks: int = ROLLING_WINDOW_WEEKS,
+) -> typing.Dict[str, typing.Tuple[int, int]]:
+    # first half, second half and every rolling window of the season, weeks inclusive
+    windows = {"weeks_1_9": (1, 9), "weeks_10_18": (10, 18)}
+    for start in range(WEEKS[0], WEEKS[-1] - rolling_weeks + 2):
+        end = start + rolling_weeks - 1
+        windows[f"rolling_weeks_{start}_{end}"] = (start, end)
+    return windows
+
+
+def compute_window_correlations(
+    years: typing.List[int] = YEARS,
+    windows: typing.Optional[typing.Dict[str, typing.Tuple[int, int]]] = None,
+    method: str = "pearson",
+    covariates: typing.Optional[typing.List[str]] = None,
+) -> pd.DataFrame:
+    # correlates the preseason features with PPG over each week window, all windows
+    # of a position and variant are computed together as one feature x window matrix
+    if windows is None:
+        windows = get_week_windows()
+    window_names = list(windows)
+    results = []
+    for year in years:
+        for ppr in [True, False]:
+            df = get_master_df(ppr=ppr, year=year)
+            if "Final_PPG" not in df.columns:
+                continue  # don't have weekly points for this year yet
+            random_corrections(df)
+            weekly_points = get_weekly_points(ppr=ppr, year=year)
+            window_ppg = get_window_ppg(weekly_points.points, list(windows.values()))
+
+            for pos, pos_df in split_by_position(df).items():
+                if pos == "UNKNOWN":
+                    continue
+                numeric_df = pos_df.drop(columns=NON_FEATURE_COLUMNS + ["Final_PPG"])
+                columns = numeric_df.columns.tolist()
+                method_inputs = _get_method_inputs(columns, columns, method, covariates)
+                if method_inputs is None:
+                    continue
+                features, covariate_idx = method_inputs
+                values = numeric_df.to_numpy(dtype=np.float64)
+                covariate_values = values[:, covariate_idx]
+                values = values[:, [columns.index(col) for col in features]]
+                finish_rows = get_finish_rows(
+                    pos_df["PLAYER_ID"].to_numpy(),
+                    pos_df["PLAYER NAME"],
+                    weekly_points.player_ids,
+                    pd.Series(weekly_points.names),
+                )
+                targets = np.where(
+                    finish_rows[:, None] >= 0, window_ppg[finish_rows], np.nan
+                )
+
+                for starters_only, should_drop_rookies in itertools.product(
+                    [True, False], repeat=2
+                ):
+                    mask = _get_variant_mask(
+                        pos_df, pos, starters_only, should_drop_rookies
+                    )
+                    with stage("correlation_matrix") as timed:
+                        correlation = correlation_matrix(
+                            values[mask], targets[mask], method, covariate_values[mask]
+                        )
+                        timed.set_shape(values[mask])
+                    results.append(
+                        pd.DataFrame(
+                            {
+                                "year": year,
+                                "ppr": ppr,
+                                "starters_only": starters_only,
+                                "drop_rookies": should_drop_rookies,
+                                "window": np.tile(window_names, len(features)),
+                                "position": pos,
+                                "method": method,
+                                "variable": np.repeat(features, len(window_names)),
+                                "value": correlation.ravel(),
+                            }
+                        )
+                    )
+
+    return pd.concat(results, ignore_index=True)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes used to render charts (default: all cores)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Render every chart even if its inputs haven't changed",
+    )
+    parser.add_argument(
+        "--windows",
+        action="store_true",
+        help="Correlate with PPG over week windows (each half of the season and "
+        "rolling windows) instead of final and same year points",
+    )
+    parser.add_argument(
+        "--rolling-weeks",
+        type=int,
+        default=ROLLING_WINDOW_WEEKS,
+        help="Number of weeks in each rolling window",
+    )
+    parser.add_argument(
+        "--pooled",
+        action="store_true",
+        help="Correlate over every season at once instead of one season at a time",
+    )
+    parser.add_argument(
+        "--cutoffs",
+        action="store_true",
+        help="Plot how each feature's correlation changes with the number of top "
+        "ranked players kept, from --min-cutoff to every player",
+    )
+    parser.add_argument("--min-cutoff", type=int, default=MIN_CUTOFF)
+    parser.add_argument(
+        "--curve-features",
+        type=int,
+        default=CURVE_FEATURES,
+        help="Number of features drawn in each cutoff chart",
+    )
+    parser.add_argument(
+        "--method",
+        choices=CORRELATION_METHODS,
+        default="pearson",
+        help="pearson, spearman (rank) or partial correlation controlling for "
+        "--covariates (default: pearson)",
+    )
+    parser.add_argument(
+        "--covariates",
+        nargs="+",
+        default=DEFAULT_COVARIATES,
+        help="Columns controlled for by --method partial (default: ADP)",
+    )
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Draw 95%% confidence intervals from N bootstrap resamples "
+        "(default: no intervals)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed for the bootstrap resamples",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="TRACE_PATH",
+        help="Time every pipeline stage, print a summary and write a Chrome trace "
+        "to TRACE_PATH",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Also track the peak allocation of every stage with --profile (slower)",
+    )
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    if args.profile:
+        enable_profiling(args.profile, trace_memory=args.profile_memory)
+    if args.windows and args.bootstrap:
+        parser.error("--bootstrap is not supported with --windows")
+    if args.windows and args.pooled:
+        parser.error("--pooled is not supported with --windows")
+    if args.cutoffs and (
+        args.windows or args.pooled or args.bootstrap or args.method != "pearson"
+    ):
+        parser.error("--cutoffs only supports pearson correlations of single seasons")
+
+    if args.cutoffs:
+        curve_df = compute_cutoff_correlations(YEARS, args.min_cutoff)
+        render_cutoff_charts(
+            curve_df, jobs=args.jobs, feature_count=args.curve_features
+        )
+        return
+    if args.method != "pearson" and args.bootstrap:
+        parser.error("--bootstrap is only supported with --method pearson")
+
+    if args.windows:
+        correlation_df = compute_window_correlations(
+            YEARS, get_week_windows(args.rolling_weeks), args.method, args.covariates
+        )
+    else:
+        compute = compute_pooled_correlations if args.pooled else compute_correlations
+        correlation_df = compute(
+            YEARS,
+            method=args.method,
+            covariates=args.covariates,
+            bootstrap_resamples=args.bootstrap,
+            seed=args.seed,
+            jobs=args.jobs,
+        )
+    render_correlation_charts(correlation_df, jobs=args.jobs, force=args.force)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Correlate preseason stats with fantasy points and save charts."
+    )
+    add_arguments(parser)
+    run(parser.parse_args(), parser)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,294 @@
+import typing
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+def _pearson_from_sums(
+    n: np.ndarray,
+    sum_x: np.ndarray,
+    sum_y: np.ndarray,
+    sum_xx: np.ndarray,
+    sum_yy: np.ndarray,
+    sum_xy: np.ndarray,
+) -> np.ndarray:
+    # correlation from the sums over the rows each pair has present, any shape
+    covariance = n * sum_xy - sum_x * sum_y
+    x_variance = n * sum_xx - sum_x * sum_x
+    y_variance = n * sum_yy - sum_y * sum_y
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correlation = covariance / np.sqrt(x_variance * y_variance)
+    # constant columns and pairs with fewer than two rows have no correlation
+    correlation[(n < 2) | (x_variance <= 0) | (y_variance <= 0)] = np.nan
+    return np.clip(correlation, -1, 1)
+
+
+def pearson_matrix(features: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    # correlation of every feature column with every target column, (k, m) result
+    # NaNs are handled like pandas' df.corr(): each pair only uses rows where both are present
+    x = np.asarray(features, dtype=np.float64)
+    y = np.asarray(targets, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+
+    x_present = ~np.isnan(x)
+    y_present = ~np.isnan(y)
+    x_weights = x_present.astype(np.float64)
+    y_weights = y_present.astype(np.float64)
+
+    # shift each column by its mean so the raw sums below don't lose precision
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = np.where(x_present, x, 0).sum(axis=0) / x_weights.sum(axis=0)
+        y_mean = np.where(y_present, y, 0).sum(axis=0) / y_weights.sum(axis=0)
+    x = np.where(x_present, x - x_mean, 0)
+    y = np.where(y_present, y - y_mean, 0)
+
+    # every sum is restricted to rows where both the feature and the target are present
+    n = x_weights.T @ y_weights
+    sum_x = x.T @ y_weights
+    sum_y = x_weights.T @ y
+    sum_xx = (x * x).T @ y_weights
+    sum_yy = x_weights.T @ (y * y)
+    sum_xy = x.T @ y
+    return _pearson_from_sums(n, sum_x, sum_y, sum_xx, sum_yy, sum_xy)
+
+
+CORRELATION_METHODS = ["pearson", "spearman", "partial"]
+
+
+def rank_columns(values: np.ndarray) -> np.ndarray:
+    # average rank of every value within its column, NaNs stay NaN (same ties as pandas)
+    return pd.DataFrame(values).rank().to_numpy(dtype=np.float64)
+
+
+def _group_by_present_rows(
+    values: np.ndarray,
+) -> typing.List[typing.Tuple[np.ndarray, np.ndarray]]:
+    # (present rows, column indices) of every distinct pattern of missing values
+    present = ~np.isnan(values)
+    patterns, pattern_idx = np.unique(present.T, axis=0, return_inverse=True)
+    pattern_idx = pattern_idx.ravel()
+    return [
+        (pattern, np.flatnonzero(pattern_idx == i))
+        for i, pattern in enumerate(patterns)
+    ]
+
+
+def spearman_matrix(features: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    # pearson_matrix of ranks, (k, m) result. Like pandas' df.corr(method="spearman")
+    # each pair is ranked over only the rows where both columns are present, so columns
+    # are ranked once per combination of missing value patterns, not once overall
+    x = np.asarray(features, dtype=np.float64)
+    y = np.asarray(targets, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+    correlation = np.full((x.shape[1], y.shape[1]), np.nan)
+    for x_rows, x_columns in _group_by_present_rows(x):
+        for y_rows, y_columns in _group_by_present_rows(y):
+            rows = x_rows & y_rows
+            correlation[np.ix_(x_columns, y_columns)] = pearson_matrix(
+                rank_columns(x[rows][:, x_columns]), rank_columns(y[rows][:, y_columns])
+            )
+    return correlation
+
+
+def residualize(values: np.ndarray, covariates: np.ndarray) -> np.ndarray:
+    # residuals of every column after a least squares fit on the covariates and an
+    # intercept, using the rows where the column and all covariates are present
+    x = np.asarray(values, dtype=np.float64)
+    z = np.asarray(covariates, dtype=np.float64)
+    if z.ndim == 1:
+        z = z[:, None]
+    z_present = ~np.isnan(z).any(axis=1)
+    design = np.column_stack([np.ones(len(z)), np.where(z_present[:, None], z, 0)])
+    present = ~np.isnan(x) & z_present[:, None]
+    weights = present.astype(np.float64)
+
+    # normal equations of every column at once: gram[k] = design.T @ diag(w_k) @ design
+    p = design.shape[1]
+    outer = (design[:, :, None] * design[:, None, :]).reshape(len(design), p * p)
+    gram = (outer.T @ weights).T.reshape(-1, p, p)
+    moments = (design.T @ np.where(present, x, 0)).T
+    # pinv keeps columns with too few rows from raising, their residuals are unusable
+    coefficients = (np.linalg.pinv(gram) @ moments[:, :, None])[:, :, 0]
+    residuals = x - design @ coefficients.T
+    return np.where(present, residuals, np.nan)
+
+
+def correlation_matrix(
+    features: np.ndarray,
+    targets: np.ndarray,
+    method: str = "pearson",
+    covariates: typing.Optional[np.ndarray] = None,
+) -> np.ndarray:
+    # pearson_matrix on ranks for spearman, or on columns residualized on the
+    # covariates for partial. Partial transforms features and targets in one pass
+    x = np.asarray(features, dtype=np.float64)
+    y = np.asarray(targets, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+    if method == "pearson":
+        return pearson_matrix(x, y)
+    if method == "spearman":
+        return spearman_matrix(x, y)
+    if method != "partial":
+        raise ValueError(f"unknown correlation method: {method}")
+    if covariates is None:
+        raise ValueError("partial correlation needs covariates")
+
+    values = residualize(np.hstack([x, y]), covariates)
+    return pearson_matrix(values[:, : x.shape[1]], values[:, x.shape[1] :])
+
+
+FIT_FIELDS = ["slope", "intercept", "r", "n", "x_min", "x_max"]
+
+
+def nonzero_linear_fits(values: np.ndarray) -> np.ndarray:
+    # least squares line for every pair of columns, ignoring rows where either value
+    # is 0 or NaN. Result is (len(FIT_FIELDS), k, k) float32 where [:, i, j] is the
+    # fit with column i on the x axis and column j on the y axis
+    x = np.asarray(values, dtype=np.float64)
+    present = (x != 0) & ~np.isnan(x)
+    weights = present.astype(np.float64)
+    x = np.where(present, x, 0)
+
+    # zeroed entries drop out of the products, so sums only cover rows with both present
+    n = weights.T @ weights
+    sum_x = x.T @ weights
+    sum_y = sum_x.T
+    sum_xx = (x * x).T @ weights
+    sum_yy = sum_xx.T
+    sum_xy = x.T @ x
+
+    covariance = n * sum_xy - sum_x * sum_y
+    x_variance = n * sum_xx - sum_x * sum_x
+    y_variance = n * sum_yy - sum_y * sum_y
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = covariance / x_variance
+        intercept = (sum_y - slope * sum_x) / n
+        correlation = np.clip(covariance / np.sqrt(x_variance * y_variance), -1, 1)
+    undefined = (n < 2) | (x_variance <= 0)
+    slope[undefined] = np.nan
+    intercept[undefined] = np.nan
+    correlation[undefined | (y_variance <= 0)] = np.nan
+
+    # range of x over the rows used by each fit, for drawing the line
+    x_min = np.full(n.shape, np.nan)
+    x_max = np.full(n.shape, np.nan)
+    for i in range(x.shape[1]):
+        pair_present = present[:, [i]] & present
+        column = x[:, [i]]
+        with np.errstate(invalid="ignore"):
+            x_min[i] = np.where(pair_present, column, np.inf).min(axis=0)
+            x_max[i] = np.where(pair_present, column, -np.inf).max(axis=0)
+    x_min[n == 0] = np.nan
+    x_max[n == 0] = np.nan
+
+    return np.stack([slope, intercept, correlation, n, x_min, x_max]).astype(np.float32)
+
+
+def _get_resample_weights(
+    sample_count: int, n_resamples: int, rng: np.random.Generator
+) -> np.ndarray:
+    # how many times each row is drawn in each resample, (n_resamples x rows)
+    draws = rng.integers(0, sample_count, size=(n_resamples, sample_count))
+    draws += np.arange(n_resamples)[:, None] * sample_count
+    counts = np.bincount(draws.ravel(), minlength=n_resamples * sample_count)
+    return counts.reshape(n_resamples, sample_count).astype(np.float64)
+
+
+def _get_pearson_moments(
+    features: np.ndarray, target: np.ndarray
+) -> typing.Tuple[np.ndarray, ...]:
+    # per row terms of the sums in pearson_matrix, (rows x features) each. Summing them
+    # over any subset or weighting of the rows gives that subset's correlation sums
+    x = np.asarray(features, dtype=np.float64)
+    y = np.asarray(target, dtype=np.float64)
+    x_present = ~np.isnan(x)
+    y_present = ~np.isnan(y)[:, None]
+    # shift by the column means so the raw sums don't lose precision
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = np.where(x_present, x, 0).sum(axis=0) / x_present.sum(axis=0)
+        y_mean = np.where(y_present[:, 0], y, 0).sum() / y_present.sum()
+    x = np.where(x_present, x - x_mean, 0)
+    y = np.where(y_present, y[:, None] - y_mean, 0)
+    x_weights = x_present.astype(np.float64)
+    y_weights = y_present.astype(np.float64)
+    # each term is restricted to rows where the feature and target are present
+    return (
+        x_weights * y_weights,
+        x * y_weights,
+        x_weights * y,
+        x * x * y_weights,
+        x_weights * y * y,
+        x * y,
+    )
+
+
+def _bootstrap_pearson(
+    moments: typing.Tuple[np.ndarray, ...], weights: np.ndarray
+) -> np.ndarray:
+    # every sum becomes one (resamples x rows) @ (rows x features) product
+    return _pearson_from_sums(*(weights @ moment for moment in moments))
+
+
+def bootstrap_pearson_ci(
+    features: np.ndarray,
+    target: np.ndarray,
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: int = 0,
+    jobs: int = 1,
+    batch_size: int = 250,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    # percentile bootstrap interval for the correlation of every feature with the target
+    moments = _get_pearson_moments(features, target)
+    row_count = len(moments[0])
+
+    # every batch gets its own seed, so results don't depend on the number of jobs
+    batch_sizes = [
+        min(batch_size, n_resamples - start)
+        for start in range(0, n_resamples, batch_size)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+
+    def run_batch(batch: typing.Tuple[int, np.random.SeedSequence]) -> np.ndarray:
+        size, batch_seed = batch
+        weights = _get_resample_weights(
+            row_count, size, np.random.default_rng(batch_seed)
+        )
+        return _bootstrap_pearson(moments, weights)
+
+    batches = list(zip(batch_sizes, seeds))
+    if jobs == 1:
+        correlations = [run_batch(batch) for batch in batches]
+    else:
+        # matrix products release the GIL, so threads spread the batches across cores
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            correlations = list(executor.map(run_batch, batches))
+
+    tail = (1 - confidence) / 2 * 100
+    with warnings.catch_warnings():
+        # features that are all NaN have no interval
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low, high = np.nanpercentile(
+            np.vstack(correlations), [tail, 100 - tail], axis=0
+        )
+    return low, high
+
+
+def cutoff_pearson(
+    features: np.ndarray, target: np.ndarray, cutoffs: typing.Sequence[int]
+) -> np.ndarray:
+    # correlation of every feature with the target over the first N rows, for every N in
+    # cutoffs. Rows should be sorted best first, every cutoff comes from one running sum
+    # of each moment, (len(cutoffs), features) result
+    last_rows = np.asarray(cutoffs) - 1
+    return _pearson_from_sums(
+        *(
+            np.cumsum(moment, axis=0)[last_rows]
+            for moment in _get_pearson_moments(features, target)
+        )
+    )
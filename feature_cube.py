@@ -0,0 +1,214 @@
+import argparse
+import contextlib
+import json
+import os
+import typing
+
+import numpy as np
+import pandas as pd
+
+import utilities
+from utilities import (
+    SCORINGS,
+    STACK_KEYS,
+    STACK_POSITIONS,
+    STRING_COLUMNS,
+    get_available_years,
+    get_master_df,
+    get_stacked_data_version,
+    get_stacked_df,
+)
+
+FEATURE_CUBE_PREFIX = "feature_cube_"
+# bump whenever the layout of the cube or its sidecar changes so old cubes are rebuilt
+CUBE_FORMAT_VERSION = 1
+# players of every slice are sorted by this column, so the top N are the first N rows
+RANK_COLUMN = "POS_RK"
+
+
+class FeatureCube(typing.NamedTuple):
+    # float32 (years x scorings x positions x players x features), read only memory map.
+    # Slices are padded with NaN rows up to the largest position group
+    values: np.ndarray
+    years: typing.List[int]
+    scorings: typing.List[str]
+    positions: typing.List[str]
+    features: typing.List[str]
+    # players in every (year, scoring, position) slice, the rows after them are padding
+    player_counts: np.ndarray
+    # names and ids of the players in every slice, keyed on "year/scoring/position"
+    player_names: typing.Dict[str, typing.List[str]]
+    player_ids: typing.Dict[str, typing.List[int]]
+    # features every (year, scoring) frame has, in that frame's column order
+    frame_features: typing.Dict[str, typing.List[str]]
+
+
+def _get_slice_key(year: int, scoring: str, position: str = "") -> str:
+    return f"{year}/{scoring}/{position}".rstrip("/")
+
+
+def _get_cube_name(data_version: str) -> str:
+    return f"{FEATURE_CUBE_PREFIX}v{CUBE_FORMAT_VERSION}_{data_version}"
+
+
+def _get_cube_paths(data_version: str) -> typing.Tuple[str, str]:
+    base_path = os.path.join(utilities.CACHE_DIR, _get_cube_name(data_version))
+    return f"{base_path}.npy", f"{base_path}.json"
+
+
+def _remove_stale_cubes(data_version: str) -> None:
+    # processes that still map an old cube keep reading it after it is unlinked.
+    # Another builder may be removing the same files
+    current_name = _get_cube_name(data_version)
+    for file_name in os.listdir(utilities.CACHE_DIR):
+        if file_name.startswith(FEATURE_CUBE_PREFIX) and not file_name.startswith(
+            current_name
+        ):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(utilities.CACHE_DIR, file_name))
+
+
+def build_feature_cube(data_version: typing.Optional[str] = None) -> None:
+    # one dense cube of every numeric column from the stacked frame of all seasons
+    data_version = data_version or get_stacked_data_version()
+    stacked_df = get_stacked_df()
+    years = get_available_years()
+    features = [
+        col
+        for col in stacked_df.columns
+        if col not in STACK_KEYS + STRING_COLUMNS + ["PLAYER_ID"]
+    ]
+    groups = {
+        keys: group_df.sort_values(by=RANK_COLUMN, kind="stable")
+        for keys, group_df in stacked_df.groupby(STACK_KEYS, observed=True)
+    }
+    player_counts = np.zeros((len(years), len(SCORINGS), len(STACK_POSITIONS)), int)
+    shape = player_counts.shape + (
+        max(len(group_df) for group_df in groups.values()),
+        len(features),
+    )
+
+    npy_path, json_path = _get_cube_paths(data_version)
+    os.makedirs(utilities.CACHE_DIR, exist_ok=True)
+    _remove_stale_cubes(data_version)
+    # every writer uses its own temp files, so server processes can build at once
+    tmp_npy_path = f"{npy_path}.{os.getpid()}.tmp"
+    values = np.lib.format.open_memmap(
+        tmp_npy_path, mode="w+", dtype=np.float32, shape=shape
+    )
+    values[:] = np.nan
+    player_names = {}
+    player_ids = {}
+    for (year, scoring, position), group_df in groups.items():
+        index = (
+            years.index(year),
+            SCORINGS.index(scoring),
+            STACK_POSITIONS.index(position),
+        )
+        values[index][: len(group_df)] = group_df[features].to_numpy(np.float32)
+        player_counts[index] = len(group_df)
+        key = _get_slice_key(year, scoring, position)
+        player_names[key] = group_df["PLAYER NAME"].tolist()
+        player_ids[key] = group_df["PLAYER_ID"].astype(int).tolist()
+    values.flush()
+    del values
+
+    frame_features = {}
+    for year in years:
+        for scoring in SCORINGS:
+            columns = get_master_df(ppr=scoring == "ppr", year=year).columns
+            frame_features[_get_slice_key(year, scoring)] = [
+                col for col in columns if col in features
+            ]
+
+    metadata = {
+        "format_version": CUBE_FORMAT_VERSION,
+        "data_version": data_version,
+        "years": years,
+        "scorings": SCORINGS,
+        "positions": STACK_POSITIONS,
+        "features": features,
+        "player_counts": player_counts.tolist(),
+        "player_names": player_names,
+        "player_ids": player_ids,
+        "frame_features": frame_features,
+    }
+    tmp_json_path = f"{json_path}.{os.getpid()}.tmp"
+    with open(tmp_json_path, "w") as f:
+        json.dump(metadata, f)
+    # the sidecar goes first, readers only open a cube once its .npy exists
+    os.replace(tmp_json_path, json_path)
+    os.replace(tmp_npy_path, npy_path)
+
+
+def get_feature_cube(data_version: typing.Optional[str] = None) -> FeatureCube:
+    # opens the cube of the current data files read only, building it first if needed.
+    # Every process maps the same file, so the values are shared through the page cache
+    data_version = data_version or get_stacked_data_version()
+    npy_path, json_path = _get_cube_paths(data_version)
+    if not os.path.exists(npy_path):
+        build_feature_cube(data_version)
+    with open(json_path) as f:
+        metadata = json.load(f)
+    return FeatureCube(
+        values=np.load(npy_path, mmap_mode="r"),
+        years=metadata["years"],
+        scorings=metadata["scorings"],
+        positions=metadata["positions"],
+        features=metadata["features"],
+        player_counts=np.array(metadata["player_counts"]),
+        player_names=metadata["player_names"],
+        player_ids=metadata["player_ids"],
+        frame_features=metadata["frame_features"],
+    )
+
+
+def get_position_values(
+    cube: FeatureCube, year: int, ppr: bool, position: str
+) -> typing.Tuple[np.ndarray, typing.List[str]]:
+    # (players x features) view of one slice without its padding, and the player names
+    scoring = "ppr" if ppr else "standard"
+    index = (
+        cube.years.index(year),
+        cube.scorings.index(scoring),
+        cube.positions.index(position),
+    )
+    player_count = cube.player_counts[index]
+    key = _get_slice_key(year, scoring, position)
+    return cube.values[index][:player_count], cube.player_names.get(key, [])
+
+
+def get_frame_features(cube: FeatureCube, year: int, ppr: bool) -> np.ndarray:
+    # feature indices of one year and scoring type, in the order get_master_df returns
+    scoring = "ppr" if ppr else "standard"
+    frame_features = cube.frame_features[_get_slice_key(year, scoring)]
+    return np.array([cube.features.index(col) for col in frame_features])
+
+
+def get_position_frame(
+    cube: FeatureCube, year: int, ppr: bool, position: str
+) -> pd.DataFrame:
+    # one slice as a frame over the mapped values, sorted by RANK_COLUMN. Columns the
+    # year doesn't have are NaN
+    values, player_names = get_position_values(cube, year, ppr, position)
+    df = pd.DataFrame(values, columns=cube.features, copy=False)
+    df.insert(0, "PLAYER NAME", player_names)
+    return df
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Build the float32 feature cube of every season, scoring type "
+        "and position in data/cache."
+    )
+    parser.parse_args()
+    build_feature_cube()
+    cube = get_feature_cube()
+    print(
+        f"Built a {' x '.join(str(size) for size in cube.values.shape)} feature cube "
+        f"({cube.values.nbytes / 2**20:.1f} MB)"
+    )
+
+
+if __name__ == "__main__":
+    main()
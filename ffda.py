@@ -0,0 +1,117 @@
+import argparse
+import importlib
+import os
+import sys
+import typing
+
+# command -> (module with add_arguments and run, help). Only the module of the command
+# being run is imported, so data only commands never load matplotlib, mplcursors or
+# the name matcher. The cache command is the add_arguments and run of this module
+COMMANDS = {
+    "correlate": (
+        "correlation",
+        "Correlate preseason stats with fantasy points and save charts.",
+    ),
+    "sos": ("sos_analysis", "Strength of schedule analysis."),
+    "pos": (
+        "pos_analysis",
+        "Plot each feature against final PPG for the given positions.",
+    ),
+    "names": (
+        "convert_fp_names",
+        "Convert FantasyPros player names to the master sheet names.",
+    ),
+    "cache": (__name__, "Show, build or clear the prepared data cache in data/cache."),
+}
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "action",
+        choices=["info", "build", "clear"],
+        help="info lists the cached files, build adds new players to the player "
+        "index and prepares every year and scoring type, clear removes the cache",
+    )
+    parser.add_argument(
+        "--years", type=int, nargs="+", help="Two digit years to build (default: all)"
+    )
+
+
+def _get_cache_entries() -> typing.List[typing.Tuple[str, int]]:
+    # (name, size in bytes) of every cached file and partitioned dataset
+    import utilities
+
+    if not os.path.isdir(utilities.CACHE_DIR):
+        return []
+    entries = []
+    for name in sorted(os.listdir(utilities.CACHE_DIR)):
+        path = os.path.join(utilities.CACHE_DIR, name)
+        if os.path.isdir(path):
+            size = sum(
+                os.path.getsize(os.path.join(directory, file_name))
+                for directory, _, file_names in os.walk(path)
+                for file_name in file_names
+            )
+        else:
+            size = os.path.getsize(path)
+        entries.append((name, size))
+    return entries
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    import utilities
+    from feature_cube import get_feature_cube
+    from player_index import build_player_index
+    from weekly_points import get_weekly_points
+
+    if args.action == "clear":
+        utilities.clear_cache()
+        print(f"Cleared {utilities.CACHE_DIR}")
+        return
+
+    if args.action == "build":
+        # one pass over every input, later commands only read the cache. New players
+        # get their ids first, the loaders only read the index
+        added = build_player_index()
+        if added:
+            print(f"Added {added} players to the player index")
+        years = args.years or utilities.get_available_years()
+        for year in years:
+            for ppr in [True, False]:
+                df = utilities.get_master_df(ppr=ppr, year=year)
+                if "Final_PPG" in df.columns:
+                    get_weekly_points(ppr=ppr, year=year)
+        utilities.get_stacked_df()
+        get_feature_cube()
+        print(f"Built the cache for 20{', 20'.join(str(year) for year in years)}")
+
+    entries = _get_cache_entries()
+    for name, size in entries:
+        print(f"{name:<50} {size / 2**20:>8.2f} MB")
+    total = sum(size for _, size in entries)
+    print(f"{len(entries)} entries, {total / 2**20:.2f} MB in {utilities.CACHE_DIR}")
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(
+        prog="ffda", description="Fantasy football data analysis."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    command = argv[0] if argv else None
+    for name, (module_name, description) in COMMANDS.items():
+        subparser = subparsers.add_parser(
+            name, help=description, description=description
+        )
+        if name != command:
+            continue
+        # only the chosen command's arguments are needed to parse this command line
+        module = importlib.import_module(module_name)
+        module.add_arguments(subparser)
+        subparser.set_defaults(run=module.run, parser=subparser)
+    args = parser.parse_args(argv)
+    args.run(args, args.parser)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,21 @@
+import argparse
+import glob
+import os
+import re
+
 import pandas as pd
-from FootballNameMatcher import match_name
 
-YEAR = 23
-YEAR_STRING = f"_{YEAR:02d}"
+from name_matching import get_aliases, match_names
+
+MASTER_FILE_PATTERN = re.compile(r"master_sheet_(?P<year>\d{2})\.csv")
 
 
 def get_df(file_path: str) -> pd.DataFrame:
     return pd.read_csv(file_path)
 
 
-def convert_fp_names(df: pd.DataFrame) -> pd.DataFrame:
-    df["PLAYER NAME"] = df["PLAYER NAME"].apply(
-        lambda x: match_name(x, force_last_name_match=True)
-    )
+def convert_fp_names(df: pd.DataFrame, jobs: int = 1) -> pd.DataFrame:
+    df["PLAYER NAME"] = match_names(df["PLAYER NAME"], jobs)
     return df
 
 
@@ -21,10 +24,65 @@ def remove_rows_with_no_name(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def main():
-    df = get_df(f"data/master_sheet{YEAR_STRING}.csv")
-    df = convert_fp_names(df)
-    df = remove_rows_with_no_name(df)
-    df.to_csv(f"data/master_sheet{YEAR_STRING}.csv", index=False)
+    parser = argparse.ArgumentParser(
+        description="Convert master sheet player names to their matched names. "
+        "Only prints what would change unless --write is given."
+    )
+    parser.add_argument(
+        "--years", type=int, nargs="+", required=True, help="Two digit years"
+    )
+    parser.add_argument(
+        "--write",
+        action="store_true",
+        help="Write the converted sheets instead of only printing the changes",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="data",
+        help="Directory the converted sheets are written to with --write "
+        "(default: data, which replaces the master sheets)",
+    )
+    parser.add_argument("--jobs", type=int, default=1)
+    args = parser.parse_args()
+
+    file_paths = []
+    for file_path in sorted(glob.glob("data/master_sheet_*.csv")):
+        match = MASTER_FILE_PATTERN.fullmatch(os.path.basename(file_path))
+        if match is None or int(match["year"]) not in args.years:
+            continue
+        file_paths.append(file_path)
+
+    if not file_paths:
+        parser.error(
+            f"no master sheets in data/ for 20{', 20'.join(map(str, args.years))}"
+        )
+
+    dfs = [get_df(file_path) for file_path in file_paths]
+    # match every name across all files in one batch, later lookups hit the cache
+    get_aliases(
+        pd.concat([df["PLAYER NAME"] for df in dfs]).dropna().unique(),
+        jobs=args.jobs,
+    )
+
+    for file_path, df in zip(file_paths, dfs):
+        original_names = df["PLAYER NAME"].copy()
+        df = convert_fp_names(df)
+        renamed = (df["PLAYER NAME"] != original_names) & df["PLAYER NAME"].notna()
+        unmatched = df["PLAYER NAME"].isna().sum()
+        df = remove_rows_with_no_name(df)
+        output_path = os.path.join(args.output_dir, os.path.basename(file_path))
+        print(
+            f"{file_path}: {renamed.sum()} names renamed, {unmatched} unmatched rows "
+            "dropped"
+        )
+        if not args.write:
+            continue
+        os.makedirs(args.output_dir, exist_ok=True)
+        df.to_csv(output_path, index=False)
+        print(f"Converted {file_path} -> {output_path}")
+
+    if not args.write:
+        print("Dry run, pass --write to save the converted sheets")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,204 @@
+import atexit
+import json
+import os
+import threading
+import time
+import tracemalloc
+import typing
+
+# set to a trace file path (or 1 for the default path) to time the pipeline stages,
+# and the memory variable to 1 to also track peak allocations
+PROFILE_ENV_VAR = "FF_PROFILE"
+PROFILE_MEMORY_ENV_VAR = "FF_PROFILE_MEMORY"
+DEFAULT_TRACE_PATH = "profile_trace.json"
+
+_trace_path: typing.Optional[str] = None
+_trace_memory = False
+_pid: typing.Optional[int] = None
+_start_time = 0.0
+# finished stages in the order they ended, and the stages that are still running
+_records: typing.List["Stage"] = []
+_open_stages: typing.List["Stage"] = []
+
+
+class _NullStage:
+    # stand in for Stage while profiling is off, every method does nothing
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        return None
+
+    def set_shape(self, data: typing.Any) -> None:
+        return None
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Stage:
+    # one run of a pipeline stage: wall time, peak allocation above what was allocated
+    # when it started, and the rows and columns the stage set with set_shape
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.rows: typing.Optional[int] = None
+        self.columns: typing.Optional[int] = None
+        self.start = 0.0
+        self.seconds = 0.0
+        self.start_bytes = 0
+        self.peak_bytes = 0
+
+    def __enter__(self) -> "Stage":
+        if _trace_memory:
+            _fold_peak()
+            self.start_bytes = self.peak_bytes = tracemalloc.get_traced_memory()[0]
+        _open_stages.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.seconds = time.perf_counter() - self.start
+        if _trace_memory:
+            _fold_peak()
+        _open_stages.remove(self)
+        _records.append(self)
+
+    def set_shape(self, data: typing.Any) -> None:
+        # frames and arrays have rows and columns, other sequences only a length
+        if not hasattr(data, "shape"):
+            self.rows = len(data)
+            return
+        self.rows = int(data.shape[0])
+        self.columns = int(data.shape[1]) if data.ndim > 1 else 1
+
+    @property
+    def peak_mb(self) -> typing.Optional[float]:
+        if not _trace_memory:
+            return None
+        return (self.peak_bytes - self.start_bytes) / 2**20
+
+
+def _fold_peak() -> None:
+    # tracemalloc has a single peak, so it is handed to every running stage and reset
+    # before a nested stage starts or ends. Each stage keeps the highest peak it saw
+    peak = tracemalloc.get_traced_memory()[1]
+    for open_stage in _open_stages:
+        open_stage.peak_bytes = max(open_stage.peak_bytes, peak)
+    tracemalloc.reset_peak()
+
+
+def is_enabled() -> bool:
+    # only the process that enabled profiling records, forked workers don't
+    return _trace_path is not None and os.getpid() == _pid
+
+
+def stage(name: str) -> typing.Union[Stage, _NullStage]:
+    # context manager timing one stage, a shared no-op when profiling is off
+    if not is_enabled():
+        return _NULL_STAGE
+    return Stage(name)
+
+
+def enable_profiling(
+    trace_path: str = DEFAULT_TRACE_PATH, trace_memory: bool = False
+) -> None:
+    # start recording, the summary and trace are written when the process exits.
+    # tracemalloc slows down allocation heavy stages like savefig several times over,
+    # so peak memory is only tracked when asked for
+    global _trace_path, _trace_memory, _pid, _start_time
+    already_enabled = is_enabled()
+    _trace_path = trace_path
+    if trace_memory and not _trace_memory:
+        _trace_memory = True
+        tracemalloc.start()
+    if already_enabled:
+        return
+    _pid = os.getpid()
+    _start_time = time.perf_counter()
+    atexit.register(write_report)
+
+
+def get_summary() -> typing.List[typing.Dict[str, typing.Any]]:
+    # one row per stage name, slowest total first. Rows are summed and columns and
+    # peak memory are the largest of any call, None when no call recorded them
+    summary: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+    for record in _records:
+        row = summary.setdefault(
+            record.name,
+            {
+                "stage": record.name,
+                "calls": 0,
+                "seconds": 0.0,
+                "peak_mb": None,
+                "rows": None,
+                "columns": None,
+            },
+        )
+        row["calls"] += 1
+        row["seconds"] += record.seconds
+        if record.peak_mb is not None:
+            row["peak_mb"] = max(row["peak_mb"] or 0.0, record.peak_mb)
+        if record.rows is not None:
+            row["rows"] = (row["rows"] or 0) + record.rows
+        if record.columns is not None:
+            row["columns"] = max(row["columns"] or 0, record.columns)
+    return sorted(summary.values(), key=lambda row: row["seconds"], reverse=True)
+
+
+def print_summary() -> None:
+    print(
+        f"{'stage':<28} {'calls':>6} {'total s':>9} {'mean ms':>9} "
+        f"{'peak MB':>9} {'rows':>10} {'max cols':>9}"
+    )
+    for row in get_summary():
+        peak_mb = "-" if row["peak_mb"] is None else f"{row['peak_mb']:.1f}"
+        rows = "-" if row["rows"] is None else row["rows"]
+        columns = "-" if row["columns"] is None else row["columns"]
+        print(
+            f"{row['stage']:<28} {row['calls']:>6} {row['seconds']:>9.3f} "
+            f"{row['seconds'] / row['calls'] * 1000:>9.2f} {peak_mb:>9} "
+            f"{rows:>10} {columns:>9}"
+        )
+
+
+def write_trace(trace_path: str) -> None:
+    # Chrome trace event format, open it in chrome://tracing or ui.perfetto.dev
+    events = [
+        {
+            "name": record.name,
+            "cat": "pipeline",
+            "ph": "X",
+            "ts": (record.start - _start_time) * 1e6,
+            "dur": record.seconds * 1e6,
+            "pid": _pid,
+            "tid": threading.main_thread().ident,
+            "args": {
+                "rows": record.rows,
+                "columns": record.columns,
+                "peak_mb": record.peak_mb,
+            },
+        }
+        for record in _records
+    ]
+    directory = os.path.dirname(trace_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(trace_path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def write_report() -> None:
+    if not is_enabled() or not _records:
+        return
+    assert _trace_path is not None
+    print_summary()
+    write_trace(_trace_path)
+    print(f"Wrote a trace of {len(_records)} stages to {_trace_path}")
+
+
+_env_value = os.environ.get(PROFILE_ENV_VAR)
+if _env_value:
+    enable_profiling(
+        DEFAULT_TRACE_PATH if _env_value == "1" else _env_value,
+        trace_memory=os.environ.get(PROFILE_MEMORY_ENV_VAR) == "1",
+    )
@@ -1,51 +1,91 @@
+import typing
+
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 
-from utilities import get_master_df, split_by_position
+from correlation import DEFAULT_COVARIATES, get_starters_count
+from correlation_engine import (
+    CORRELATION_METHODS,
+    FIT_FIELDS,
+    correlation_matrix,
+    nonzero_linear_fits,
+)
+from feature_cube import (
+    FeatureCube,
+    get_feature_cube,
+    get_frame_features,
+    get_position_values,
+)
+from utilities import get_stacked_data_version
 
 POSITIONS = ["QB", "RB", "WR", "TE", "DEF", "K"]
 
 
-def remove_non_starters(df: pd.DataFrame) -> pd.DataFrame:
-    pos = df["POS"].iloc[0]
-
-    if pos == "WR":
-        # Only keep the top 64 WRs based on position rank
-        return df.nsmallest(64, "POS_RK")
-    else:
-        # Only keep the top 32 players for other positions
-        return df.nsmallest(32, "POS_RK")
-
-
-def drop_non_relevant_columns(df: pd.DataFrame) -> pd.DataFrame:
-    # any rows with NAN in a column, drop those columns
-    df = df.dropna(axis=1, how="any")
-    # if there are any columns that have 0 for every row, drop those columns
-    df = df.loc[:, (df != 0).any(axis=0)]
-    df = df.drop(columns=["TEAM"], errors="ignore")
+def get_relevant_columns(values: np.ndarray) -> np.ndarray:
+    # columns with a value for every player that aren't 0 for all of them
+    return ~np.isnan(values).any(axis=0) & (values != 0).any(axis=0)
+
+
+@st.cache_resource(show_spinner=False)
+def load_feature_cube(data_version: str) -> FeatureCube:
+    # one read only memory map shared by every session, and by every server process
+    # through the page cache. data_version is part of the cache key, so edited data
+    # files map a rebuilt cube
+    return get_feature_cube(data_version)
+
+
+def load_position_df(
+    year: int, ppr: bool, position: str, data_version: str
+) -> pd.DataFrame:
+    # starters of the position, cube slices are sorted by POS_RK so they come first
+    cube = load_feature_cube(data_version)
+    values, player_names = get_position_values(cube, year, ppr, position)
+    rank = values[:, cube.features.index("POS_RK")]
+    starters = min(get_starters_count(position), int((~np.isnan(rank)).sum()))
+    # only the starters are copied out of the cube, in the year's own column order
+    feature_idx = get_frame_features(cube, year, ppr)
+    features = [cube.features[i] for i in feature_idx]
+    values = values[:starters, feature_idx]
+    relevant = get_relevant_columns(values)
+    df = pd.DataFrame(
+        values[:, relevant],
+        columns=[col for col, keep in zip(features, relevant) if keep],
+    )
+    df.insert(0, "PLAYER NAME", player_names[:starters])
     return df
 
 
-def clean_dfs(position_dfs: dict) -> dict:
-    for key, df in position_dfs.items():
-        df = remove_non_starters(df)
-        df = drop_non_relevant_columns(df)
-        position_dfs[key] = df
-    return position_dfs
+@st.cache_data(show_spinner=False)
+def load_fit_index(
+    year: int, ppr: bool, position: str, data_version: str
+) -> typing.Tuple[typing.List[str], np.ndarray]:
+    # line of best fit and correlation for every pair of numeric features
+    df = load_position_df(year, ppr, position, data_version)
+    numeric_df = df.select_dtypes(include=["number"])
+    return numeric_df.columns.tolist(), nonzero_linear_fits(numeric_df.to_numpy())
+
+
+@st.cache_data(show_spinner=False)
+def load_correlation_matrix(
+    year: int, ppr: bool, position: str, method: str, data_version: str
+) -> np.ndarray:
+    # every numeric feature against every other, transformed once for the method
+    df = load_position_df(year, ppr, position, data_version)
+    numeric_df = df.select_dtypes(include=["number"])
+    values = numeric_df.to_numpy(dtype=np.float64)
+    if method != "partial":
+        return correlation_matrix(values, values, method)
+    covariate_idx = [numeric_df.columns.get_loc(col) for col in DEFAULT_COVARIATES]
+    matrix = correlation_matrix(values, values, method, values[:, covariate_idx])
+    # covariates have nothing left to correlate once they are controlled for
+    matrix[covariate_idx, :] = np.nan
+    matrix[:, covariate_idx] = np.nan
+    return matrix
 
 
 def main() -> None:
-    # Load and prepare data
-    dfs = {}
-    for year in [24, 23]:
-        for ppr in [True, False]:
-            df = get_master_df(ppr=ppr, year=year)
-            position_dfs = split_by_position(df)
-            position_dfs = clean_dfs(position_dfs)
-            dfs[f"{year}_{'PPR' if ppr else 'Standard'}"] = position_dfs
-
     st.title("Interactive Feature Analysis")
 
     # Dropdowns for year and scoring type
@@ -63,9 +103,10 @@ def main() -> None:
         "Select Scoring Type", scoring_options, index=0, key="scoring"
     )
 
-    # Map selections to key for dfs dict
-    dfs_key = f"{selected_year}_{selected_scoring}"
-    position_dfs = dfs[dfs_key]
+    # every year and scoring type is a slice of the feature cube, mapped once per process
+    year = int(selected_year)
+    ppr = selected_scoring == "PPR"
+    data_version = get_stacked_data_version()
     positions = POSITIONS
 
     # Set default axis labels based on scoring type
@@ -74,10 +115,10 @@ def main() -> None:
 
     # Dropdown for position selection
     selected_position = st.selectbox("Select Position", positions, key="position")
-    current_df = position_dfs[selected_position]
+    current_df = load_position_df(year, ppr, selected_position, data_version)
 
-    # Get numeric columns for axis selection
-    numeric_cols = current_df.select_dtypes(include=["number"]).columns.tolist()
+    # Get numeric columns for axis selection along with their precomputed fits
+    numeric_cols, fit_index = load_fit_index(year, ppr, selected_position, data_version)
 
     # Try to keep previous selections if still available
     prev_x = st.session_state.selected_x
@@ -97,9 +138,46 @@ def main() -> None:
         )
     )
 
+    # Partial correlations need every covariate, older years don't have ADP
+    method_options = [
+        method
+        for method in CORRELATION_METHODS
+        if method != "partial" or set(DEFAULT_COVARIATES) <= set(numeric_cols)
+    ]
+    selected_method = st.selectbox(
+        "Correlation Method",
+        method_options,
+        key="method",
+        help=f"partial controls for {', '.join(DEFAULT_COVARIATES)}",
+    )
+    method_matrix = (
+        None
+        if selected_method == "pearson"
+        else load_correlation_matrix(
+            year, ppr, selected_position, selected_method, data_version
+        )
+    )
+
+    # Optionally order the X features by how strongly they correlate with Y
+    sort_by_correlation = st.checkbox(
+        "Sort X features by correlation with Y", key="sort_x"
+    )
+    x_options = numeric_cols
+    if sort_by_correlation:
+        current_y = st.session_state.get("y_axis", y_axis)
+        if current_y not in numeric_cols:
+            current_y = y_axis
+        # pearson uses the r of the fit lines, the other methods their own matrix
+        correlations = (
+            fit_index[FIT_FIELDS.index("r")] if method_matrix is None else method_matrix
+        )
+        strength = np.abs(correlations[:, numeric_cols.index(current_y)])
+        order = np.argsort(-np.nan_to_num(strength, nan=-1), kind="stable")
+        x_options = [numeric_cols[i] for i in order]
+
     # Dropdowns for axis selection
     selected_x = st.selectbox(
-        "X Axis Feature", numeric_cols, index=numeric_cols.index(x_axis), key="x_axis"
+        "X Axis Feature", x_options, index=x_options.index(x_axis), key="x_axis"
     )
     selected_y = st.selectbox(
         "Y Axis Feature", numeric_cols, index=numeric_cols.index(y_axis), key="y_axis"
@@ -125,29 +203,30 @@ def main() -> None:
         title=f"{selected_x} vs {selected_y} for {selected_position} ({selected_year} {selected_scoring})",
         opacity=0.7,
     )
-    # Add line of best fit
-    try:
-        # ignore 0 values for fitting
-        non_zero_df = current_df[
-            (current_df[selected_x] != 0) & (current_df[selected_y] != 0)
-        ]
-        if non_zero_df.empty:
-            st.warning("No data available for line fitting.")
-            return
-        z = np.polyfit(non_zero_df[selected_x], non_zero_df[selected_y], 1)
-        p = np.poly1d(z)
-        x_vals = np.linspace(
-            non_zero_df[selected_x].min(), non_zero_df[selected_x].max(), 100
-        )
+    # Add line of best fit from the precomputed fits (0 values are ignored)
+    x_idx = numeric_cols.index(selected_x)
+    y_idx = numeric_cols.index(selected_y)
+    fit = dict(zip(FIT_FIELDS, fit_index[:, x_idx, y_idx]))
+    if fit["n"] == 0:
+        st.warning("No data available for line fitting.")
+        return
+    if np.isnan(fit["slope"]):
+        st.warning(f"Could not fit line: not enough distinct {selected_x} values")
+    else:
+        x_vals = np.linspace(fit["x_min"], fit["x_max"], 100)
         fig.add_traces(
             px.line(
                 x=x_vals,
-                y=p(x_vals),
+                y=fit["slope"] * x_vals + fit["intercept"],
                 labels={"x": selected_x, "y": selected_y},
             ).data
         )
-    except Exception as e:
-        st.warning(f"Could not fit line: {e}")
+        caption = f"r = {fit['r']:.3f} across {int(fit['n'])} players"
+        if method_matrix is not None:
+            caption += (
+                f", {selected_method} correlation = {method_matrix[x_idx, y_idx]:.3f}"
+            )
+        st.caption(caption)
     st.plotly_chart(fig, use_container_width=True)
 
 
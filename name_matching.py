@@ -0,0 +1,63 @@
+import json
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# raw name -> canonical name. Names the matcher couldn't find aren't stored, so they
+# are matched again once the source files or the matcher are fixed
+ALIAS_CACHE_PATH = os.path.join(os.path.dirname(__file__), "data", "name_aliases.json")
+# names the matcher couldn't find in this process, only matched again by the next run
+_unmatched_names: typing.Set[str] = set()
+
+
+def load_alias_cache() -> typing.Dict[str, str]:
+    if not os.path.exists(ALIAS_CACHE_PATH):
+        return {}
+    with open(ALIAS_CACHE_PATH) as f:
+        aliases = json.load(f)
+    # older caches stored misses as null
+    return {name: alias for name, alias in aliases.items() if alias is not None}
+
+
+def save_alias_cache(aliases: typing.Dict[str, str]) -> None:
+    tmp_path = f"{ALIAS_CACHE_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(aliases, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, ALIAS_CACHE_PATH)
+
+
+def _match_name(name: str) -> typing.Optional[str]:
+    # the matcher is slow to import, so it is only loaded once a name misses the cache
+    from FootballNameMatcher import match_name
+
+    return match_name(name, force_last_name_match=True)
+
+
+def get_aliases(names: typing.Iterable[str], jobs: int = 1) -> typing.Dict[str, str]:
+    # only names missing from the on disk cache are sent to the matcher, once each.
+    # Names without a match are left out of the result
+    aliases = load_alias_cache()
+    misses = sorted(
+        {name for name in names if name not in aliases and name not in _unmatched_names}
+    )
+    if misses:
+        print(f"Matching {len(misses)} new names")
+        if jobs == 1:
+            matched = [_match_name(name) for name in misses]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                matched = list(executor.map(_match_name, misses, chunksize=32))
+        for name, alias in zip(misses, matched):
+            if alias is None:
+                _unmatched_names.add(name)
+            else:
+                aliases[name] = alias
+        save_alias_cache(aliases)
+    return aliases
+
+
+def match_names(names: pd.Series, jobs: int = 1) -> pd.Series:
+    aliases = get_aliases(names.dropna().unique(), jobs)
+    return names.map(aliases)
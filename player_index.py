@@ -0,0 +1,187 @@
+import argparse
+import contextlib
+import glob
+import os
+import re
+import typing
+
+import numpy as np
+import pandas as pd
+
+# one row per (name, position, team) seen in the data files. A player keeps the same
+# id when they change teams, as long as only one player has their name and position
+PLAYER_INDEX_PATH = os.path.join(os.path.dirname(__file__), "data", "player_ids.csv")
+INDEX_COLUMNS = ["player_id", "name", "pos", "team"]
+# FantasyPros finish files call defenses DST, the master sheets call them DEF
+POSITION_ALIASES = {"DST": "DEF"}
+# files with players in them and their name, position and team columns
+MASTER_FILE_PATTERN = re.compile(r"master_sheet_(?P<year>\d+)\.csv")
+FINISH_FILE_PATTERN = re.compile(
+    r"fp_converted_names_(?P<scoring>ppr|standard)_(?P<year>\d+)\.csv"
+)
+MASTER_KEY_COLUMNS = ["PLAYER NAME", "POS", "TEAM"]
+FINISH_KEY_COLUMNS = ["Player", "Pos", "Team"]
+
+
+def normalize_names(names: pd.Series) -> pd.Series:
+    return (
+        names.astype("string")
+        .str.upper()
+        .str.replace(r"[^A-Z0-9 \-]", "", regex=True)
+        .str.split()
+        .str.join(" ")
+    )
+
+
+def _normalize_keys(
+    names: pd.Series, positions: pd.Series, teams: pd.Series
+) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "name": normalize_names(names).to_numpy(dtype=object),
+            "pos": positions.astype("string")
+            .str.upper()
+            .replace(POSITION_ALIASES)
+            .to_numpy(dtype=object),
+            "team": teams.astype("string").str.upper().to_numpy(dtype=object),
+        }
+    )
+
+
+def load_player_index() -> pd.DataFrame:
+    if not os.path.exists(PLAYER_INDEX_PATH):
+        return pd.DataFrame(columns=INDEX_COLUMNS).astype({"player_id": np.int64})
+    return pd.read_csv(
+        PLAYER_INDEX_PATH,
+        dtype={"player_id": np.int64, "name": str, "pos": str, "team": str},
+        keep_default_na=False,
+    )
+
+
+def _save_player_index(index_df: pd.DataFrame) -> None:
+    tmp_path = f"{PLAYER_INDEX_PATH}.{os.getpid()}.tmp"
+    index_df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, PLAYER_INDEX_PATH)
+
+
+def _lookup(keys: pd.DataFrame, index_df: pd.DataFrame) -> np.ndarray:
+    # exact (name, pos, team) match first, then (name, pos) when it maps to one player
+    exact = keys.merge(index_df, on=["name", "pos", "team"], how="left")
+    ids = exact["player_id"].to_numpy(dtype=np.float64)
+
+    ids_per_player = index_df.groupby(["name", "pos"])["player_id"].agg(
+        ["min", "nunique"]
+    )
+    unambiguous = ids_per_player[ids_per_player["nunique"] == 1]["min"].rename(
+        "player_id"
+    )
+    fallback = keys.merge(
+        unambiguous, left_on=["name", "pos"], right_index=True, how="left"
+    )
+    missing = np.isnan(ids)
+    ids[missing] = fallback["player_id"].to_numpy(dtype=np.float64)[missing]
+    return ids
+
+
+def get_player_ids(
+    names: pd.Series, positions: pd.Series, teams: pd.Series
+) -> np.ndarray:
+    # stable integer id for every row. Loaders only read the stored index, it is only
+    # written by build_player_index, so every process and cache sees the same ids.
+    # Raises KeyError for players that aren't in the index yet
+    keys = _normalize_keys(names, positions, teams).fillna("")
+    ids = _lookup(keys, load_player_index())
+    missing = np.isnan(ids)
+    if missing.any():
+        examples = keys[missing].drop_duplicates().head(3).agg(" ".join, axis=1)
+        raise KeyError(
+            f"{int(missing.sum())} players are not in {PLAYER_INDEX_PATH} "
+            f"(e.g. {', '.join(examples)}), run `python player_index.py` to add them"
+        )
+    return ids.astype(np.int64)
+
+
+def _add_players(index_df: pd.DataFrame, keys: pd.DataFrame) -> pd.DataFrame:
+    # store every (name, pos, team) that isn't in the index yet
+    ids = _lookup(keys, index_df)
+    new_rows = keys.assign(player_id=ids).drop_duplicates(["name", "pos", "team"])
+    stored = new_rows.merge(
+        index_df[["name", "pos", "team"]], how="left", indicator=True
+    )["_merge"]
+    new_rows = new_rows[(stored == "left_only").to_numpy()]
+    if new_rows.empty:
+        return index_df
+    # players on a new team keep their id. Players that were never seen before get
+    # the next ids, one per (name, pos, team) so players sharing a name don't collide
+    unknown = new_rows["player_id"].isna().to_numpy()
+    next_id = int(index_df["player_id"].max()) + 1 if len(index_df) else 1
+    new_rows.loc[unknown, "player_id"] = np.arange(next_id, next_id + unknown.sum())
+    new_rows = new_rows.astype({"player_id": np.int64})[INDEX_COLUMNS]
+    return pd.concat([index_df, new_rows], ignore_index=True)
+
+
+def _get_data_files() -> typing.List[typing.Tuple[str, typing.List[str]]]:
+    # (path, key columns) of every master sheet and finish file next to the index,
+    # oldest season first and each master sheet before its finish files, so a player
+    # keeps the id of the first team they were seen on
+    data_files = []
+    data_dir = os.path.dirname(PLAYER_INDEX_PATH)
+    for file_path in glob.glob(os.path.join(data_dir, "*.csv")):
+        file_name = os.path.basename(file_path)
+        for order, (pattern, key_columns) in enumerate(
+            [
+                (MASTER_FILE_PATTERN, MASTER_KEY_COLUMNS),
+                (FINISH_FILE_PATTERN, FINISH_KEY_COLUMNS),
+            ]
+        ):
+            match = pattern.fullmatch(file_name)
+            if match:
+                data_files.append(
+                    ((int(match["year"]), order, file_name), file_path, key_columns)
+                )
+    return [
+        (file_path, key_columns) for _, file_path, key_columns in sorted(data_files)
+    ]
+
+
+@contextlib.contextmanager
+def _lock_player_index() -> typing.Iterator[None]:
+    # only one process adds players at a time, the lock is released when the file closes
+    import fcntl
+
+    with open(f"{PLAYER_INDEX_PATH}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def build_player_index() -> int:
+    # adds every player in the data files that isn't in the index yet and returns how
+    # many rows were added. Existing ids never change
+    with _lock_player_index():
+        index_df = load_player_index()
+        added = 0
+        for file_path, key_columns in _get_data_files():
+            df = pd.read_csv(file_path, usecols=key_columns, dtype=str)
+            # the loaders drop master sheet rows without a position
+            df = df[df[key_columns[1]].notna()]
+            keys = _normalize_keys(*(df[col] for col in key_columns)).fillna("")
+            updated_df = _add_players(index_df, keys)
+            added += len(updated_df) - len(index_df)
+            index_df = updated_df
+        if added:
+            _save_player_index(index_df)
+    return added
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Add the players of every master sheet and finish file in data/ "
+        "to the player id index."
+    )
+    parser.parse_args()
+    added = build_player_index()
+    print(f"Added {added} players to {PLAYER_INDEX_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,58 @@
-import sys
+import argparse
+import os
 import typing
+from concurrent.futures import ProcessPoolExecutor
 
-import matplotlib.pyplot as plt
-import mplcursors
 import numpy as np
 import pandas as pd
 
-from utilities import get_master_df
+from utilities import get_master_df, set_window_position, split_by_position
+
+if typing.TYPE_CHECKING:
+    from matplotlib.axes import Axes
 
 PPR = False
 YEAR = 23
+POSITIONS = ["QB", "RB", "WR", "TE", "DEF", "K"]
 
 
-def set_window_position() -> None:
-    # Set the position of the matplotlib window to the top left corner of the screen
-    manager = plt.get_current_fig_manager()
-    if hasattr(manager, "window"):
-        manager.window.move(100, 100)  # type: ignore
-    else:
-        print(
-            "Warning: Unable to set window position. This may not work in all environments."
-        )
-
-
-def add_final_finish_to_old_df(
-    old_df: pd.DataFrame, final_df: pd.DataFrame
-) -> pd.DataFrame:
-    # create a dictionary to map player names to their final finish
-    # ignore total points and only use PPG. We don't predict injuries
-    final_ppg_dict = final_df.set_index("Player")["AVG"].to_dict()
-    # add a new column to the old_df with the final finish
-    old_df["Final_PPG"] = old_df["PLAYER NAME"].map(final_ppg_dict)
-    # drop rows where Final_PPG is NaN
-    old_df = old_df[old_df["Final_PPG"].notna()]
-    # any value that has %, remove the % sign and convert to float
-    old_df = old_df.replace("%", "", regex=True)
-    return old_df
+def _get_feature_df(df: pd.DataFrame) -> pd.DataFrame:
+    # get all columns that are numeric and don't have NaN values
+    numeric_df = df.drop(columns=["PLAYER_ID"], errors="ignore")
+    numeric_df = numeric_df.select_dtypes(include=["number"]).dropna(axis=1)
+    # drop columns that all have 0 values
+    return numeric_df.loc[:, (numeric_df != 0).any(axis=0)]
 
 
-def split_by_position(df: pd.DataFrame) -> typing.Dict[str, pd.DataFrame]:
-    return {pos: df[df["POS"] == pos] for pos in df["POS"].unique()}
+def draw_feature(ax: "Axes", x: pd.Series, final_ppg: pd.Series, column: str):
+    scatter = ax.scatter(x, final_ppg, alpha=0.5)
+    ax.set_title(f"{column} vs Final PPG")
+    ax.set_xlabel(column)
+    ax.set_ylabel("Final PPG")
+    # add a line of best fit
+    try:
+        z = np.polyfit(x, final_ppg, 1)
+        p = np.poly1d(z)
+        ax.plot(x, p(x), color="red")
+    except Exception as e:
+        print(f"Error fitting line for {column}: {e}")
+    ax.grid()
+    return scatter
 
 
 def plot_by_feature(df: pd.DataFrame) -> None:
-    # get all columns that are numeric and don't have NaN values
-    numeric_df = df.select_dtypes(include=["number"]).dropna(axis=1)
-    # drop columns that all have 0 values
-    numeric_df = numeric_df.loc[:, (numeric_df != 0).any(axis=0)]
+    # pyplot and mplcursors are only imported for interactive windows
+    import matplotlib.pyplot as plt
+    import mplcursors
+
+    numeric_df = _get_feature_df(df)
     # plot each numeric column against Final_PPG
     for column in numeric_df.columns:
         if column != "Final_PPG":
             plt.figure(figsize=(10, 6))
-            scatter = plt.scatter(
-                numeric_df[column], numeric_df["Final_PPG"], alpha=0.5
+            scatter = draw_feature(
+                plt.gca(), numeric_df[column], numeric_df["Final_PPG"], column
             )
-            plt.title(f"{column} vs Final PPG")
-            plt.xlabel(column)
-            plt.ylabel("Final PPG")
-            # add a line of best fit
-            try:
-                z = np.polyfit(numeric_df[column], numeric_df["Final_PPG"], 1)
-                p = np.poly1d(z)
-                plt.plot(numeric_df[column], p(numeric_df[column]), color="red")
-            except Exception as e:
-                print(f"Error fitting line for {column}: {e}")
-            plt.grid()
             plt.tight_layout()
             set_window_position()
             # Add interactive hover labels using mplcursors
@@ -79,6 +67,58 @@ def plot_by_feature(df: pd.DataFrame) -> None:
             plt.show()
 
 
+def get_feature_image_path(
+    output_dir: str, position: str, column: str, image_format: str
+) -> str:
+    ppr_string = "ppr" if PPR else "standard"
+    file_name = f"{column.replace(os.sep, '_')}.{image_format}"
+    return os.path.join(
+        output_dir, "pos_analysis", str(YEAR), ppr_string, position, file_name
+    )
+
+
+def _save_feature_plot(
+    task: typing.Tuple[pd.Series, pd.Series, str, str],
+) -> None:
+    x, final_ppg, column, image_path = task
+    from matplotlib.figure import Figure
+
+    # object oriented api with the default Agg canvas, no windows are opened
+    fig = Figure(figsize=(10, 6))
+    draw_feature(fig.add_subplot(), x, final_ppg, column)
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    fig.savefig(image_path)
+
+
+def save_feature_plots(
+    position_dfs: typing.Dict[str, pd.DataFrame],
+    output_dir: str,
+    image_format: str,
+    jobs: int,
+) -> None:
+    tasks = []
+    for position, df in position_dfs.items():
+        numeric_df = _get_feature_df(df)
+        for column in numeric_df.columns:
+            if column != "Final_PPG":
+                image_path = get_feature_image_path(
+                    output_dir, position, column, image_format
+                )
+                tasks.append(
+                    (numeric_df[column], numeric_df["Final_PPG"], column, image_path)
+                )
+
+    print(f"Saving {len(tasks)} plots to {output_dir}")
+    if jobs == 1:
+        for task in tasks:
+            _save_feature_plot(task)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # consume the iterator so worker exceptions are raised here
+        list(executor.map(_save_feature_plot, tasks, chunksize=8))
+
+
 def remove_players_with_no_stats_last_year(df: pd.DataFrame) -> pd.DataFrame:
     # if AVG_FAN PTS is 0 or NaN, remove the player
     df = df[df["AVG_FAN PTS"].notna() & (df["AVG_FAN PTS"] != 0)]
@@ -89,26 +129,51 @@ def top_n_players_by_ppg(df: pd.DataFrame, n: int) -> pd.DataFrame:
     return df.nlargest(n, "Final_PPG")
 
 
-def main() -> None:
-    assert (
-        len(sys.argv) == 2
-    ), "Please provide a position as an argument [QB, RB, WR, TE, K]"
-    position = sys.argv[1]
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "positions", nargs="+", choices=POSITIONS, help="Positions to analyze"
+    )
+    parser.add_argument(
+        "--save",
+        action="store_true",
+        help="Save every plot to disk instead of showing interactive windows",
+    )
+    parser.add_argument("--output-dir", default="images")
+    parser.add_argument("--format", choices=["png", "svg"], default="png")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
 
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
     df = get_master_df(ppr=PPR, year=YEAR)
     df = remove_players_with_no_stats_last_year(df)
-
-    pos_df = split_by_position(df).get(position)
-    if pos_df is None:
-        print(f"No data found for position: {position}")
+    all_position_dfs = split_by_position(df)
+
+    position_dfs = {}
+    for position in args.positions:
+        pos_df = all_position_dfs.get(position)
+        if pos_df is None:
+            print(f"No data found for position: {position}")
+            continue
+
+        if position == "WR":
+            pos_df = top_n_players_by_ppg(pos_df, 64)
+        else:
+            pos_df = top_n_players_by_ppg(pos_df, 32)
+        position_dfs[position] = pos_df
+
+    if args.save:
+        save_feature_plots(position_dfs, args.output_dir, args.format, args.jobs)
         return
+    for pos_df in position_dfs.values():
+        plot_by_feature(pos_df)
 
-    if position == "WR":
-        pos_df = top_n_players_by_ppg(pos_df, 64)
-    else:
-        pos_df = top_n_players_by_ppg(pos_df, 32)
 
-    plot_by_feature(pos_df)
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Plot each feature against final PPG for the given positions."
+    )
+    add_arguments(parser)
+    run(parser.parse_args(), parser)
 
 
 if __name__ == "__main__":
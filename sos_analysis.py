@@ -1,10 +1,22 @@
-import matplotlib.pyplot as plt
-import mplcursors
+import argparse
+import itertools
+import os
+import typing
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
-from matplotlib import colors
 
-from utilities import get_master_df, set_window_position, split_by_position
+from instrumentation import enable_profiling, stage
+from utilities import (
+    get_master_df,
+    has_final_finish,
+    set_window_position,
+    split_by_position,
+)
+
+if typing.TYPE_CHECKING:
+    from matplotlib.axes import Axes
 
 PPR = True
 PPR_STRING = "PPR" if PPR else "Standard"
@@ -15,15 +27,19 @@ YEAR = 24
 MAX_RANK_DIFFERENCE = 3
 MIN_SOS_DIFFERENCE = 10
 
+POSITIONS = ["QB", "RB", "WR", "TE", "DEF", "K"]
+SWEEP_YEARS = [24, 23]
+SWEEP_MAX_RANK_DIFFERENCES = list(range(1, 11))
+SWEEP_MIN_SOS_DIFFERENCES = list(range(0, 22, 2))
+# ranks and SOS have one decimal, so differences of them are only off by float rounding
+THRESHOLD_TOLERANCE = 1e-6
+# the only master sheet columns the analysis and plots use
+SOS_COLUMNS = ["PLAYER NAME", "POS", RANK_STRING, "FULL_SOS", "Final_PPG"]
 
-def is_sos_a_good_deciding_factor(
-    df: pd.DataFrame,
-    show_comparisons: bool,
-    min_sos_difference: int = MIN_SOS_DIFFERENCE,
-    max_rank_difference: int = MAX_RANK_DIFFERENCE,
-) -> None:
-    df = df.dropna(subset=["POS_AVG.", "FULL_SOS", "Final_PPG"])
+
+def get_ranked_sos_df(df: pd.DataFrame) -> pd.DataFrame:
     position = df["POS"].iloc[0]
+    df = df.dropna(subset=["POS_AVG.", "FULL_SOS", "Final_PPG"])
     if position == "WR":
         # only keep the top 64 WRs based on Final_PPG
         df = df.nlargest(64, "Final_PPG")
@@ -33,70 +49,134 @@ def is_sos_a_good_deciding_factor(
 
     # sort df by position rank
     if PPR and (position == "RB" or position == "WR" or position == "TE"):
-        df = df.sort_values(by=RANK_STRING).reset_index(drop=True)
-    else:
-        df = df.sort_values(by="POS_AVG.").reset_index(drop=True)
+        return df.sort_values(by=RANK_STRING).reset_index(drop=True)
+    return df.sort_values(by="POS_AVG.").reset_index(drop=True)
 
-    sos_correct = 0
-    sos_wrong = 0
 
-    for i in range(1, len(df)):
-        ppr_avg_rank_1 = df.iloc[i - 1][RANK_STRING]
-        ppr_avg_rank_2 = df.iloc[i][RANK_STRING]
-        if ppr_avg_rank_2 - ppr_avg_rank_1 > max_rank_difference:
-            continue
+def in_sos_thresholds(
+    rank_difference: np.ndarray,
+    sos_difference: np.ndarray,
+    min_sos_difference: typing.Union[float, np.ndarray],
+    max_rank_difference: typing.Union[float, np.ndarray],
+) -> np.ndarray:
+    # whether each pair is within the thresholds, a difference that only misses a
+    # threshold by float rounding (16.2 - 15.2 = 1.000001) still counts
+    return (rank_difference <= max_rank_difference + THRESHOLD_TOLERANCE) & (
+        sos_difference >= min_sos_difference - THRESHOLD_TOLERANCE
+    )
 
-        sos_1 = df.iloc[i - 1]["FULL_SOS"]
-        sos_2 = df.iloc[i]["FULL_SOS"]
-        final_ppg_1 = df.iloc[i - 1]["Final_PPG"]
-        final_ppg_2 = df.iloc[i]["Final_PPG"]
 
-        player_1 = df.iloc[i - 1]["PLAYER NAME"]
-        player_2 = df.iloc[i]["PLAYER NAME"]
+def get_sos_comparisons(
+    df: pd.DataFrame,
+    min_sos_difference: float = MIN_SOS_DIFFERENCE,
+    max_rank_difference: float = MAX_RANK_DIFFERENCE,
+    adjacent_only: bool = True,
+) -> pd.DataFrame:
+    # df must be sorted by rank. Compares every pair of players within max_rank_difference
+    # of each other, or only neighbors in the ranking when adjacent_only is set
+    ranks = df[RANK_STRING].to_numpy(dtype=np.float64)
+    count = len(ranks)
+    if adjacent_only:
+        first = np.arange(count - 1)
+        second = first + 1
+    else:
+        # for each player, every later player up to the last one within the rank window
+        window_end = np.searchsorted(
+            ranks, ranks + max_rank_difference + THRESHOLD_TOLERANCE, side="right"
+        )
+        pairs_per_player = window_end - np.arange(count) - 1
+        first = np.repeat(np.arange(count), pairs_per_player)
+        pair_offsets = np.arange(len(first)) - np.repeat(
+            np.cumsum(pairs_per_player) - pairs_per_player, pairs_per_player
+        )
+        second = first + 1 + pair_offsets
+
+    sos = df["FULL_SOS"].to_numpy(dtype=np.float64)
+    final_ppg = df["Final_PPG"].to_numpy()
+    rank_difference = ranks[second] - ranks[first]
+    sos_difference = np.abs(sos[first] - sos[second])
+    keep = in_sos_thresholds(
+        rank_difference, sos_difference, min_sos_difference, max_rank_difference
+    )
+    first = first[keep]
+    second = second[keep]
+
+    sos_1, sos_2 = sos[first], sos[second]
+    final_ppg_1, final_ppg_2 = final_ppg[first], final_ppg[second]
+    # the player with the lower SOS number should end up with more PPG
+    sos_correct = ((sos_1 < sos_2) & (final_ppg_1 > final_ppg_2)) | (
+        (sos_2 < sos_1) & (final_ppg_2 > final_ppg_1)
+    )
+    player_names = df["PLAYER NAME"].to_numpy()
+    return pd.DataFrame(
+        {
+            "player_1": player_names[first],
+            "player_2": player_names[second],
+            "rank_1": ranks[first],
+            "rank_2": ranks[second],
+            "sos_1": sos_1,
+            "sos_2": sos_2,
+            "final_ppg_1": final_ppg_1,
+            "final_ppg_2": final_ppg_2,
+            "rank_difference": rank_difference[keep],
+            "sos_difference": sos_difference[keep],
+            "sos_correct": sos_correct,
+        }
+    )
 
-        if abs(sos_1 - sos_2) < min_sos_difference:
-            continue
 
-        if show_comparisons:
+def is_sos_a_good_deciding_factor(
+    df: pd.DataFrame,
+    show_comparisons: bool,
+    min_sos_difference: int = MIN_SOS_DIFFERENCE,
+    max_rank_difference: int = MAX_RANK_DIFFERENCE,
+    adjacent_only: bool = True,
+) -> pd.DataFrame:
+    position = df["POS"].iloc[0]
+    df = get_ranked_sos_df(df)
+    with stage("get_sos_comparisons") as timed:
+        comparisons = get_sos_comparisons(
+            df, min_sos_difference, max_rank_difference, adjacent_only
+        )
+        timed.set_shape(df)
+
+    if show_comparisons:
+        for row in comparisons.itertuples():
             print(
-                f"  {player_1}({ppr_avg_rank_1}) vs {player_2}({ppr_avg_rank_2}), {sos_1} vs {sos_2}, {final_ppg_1} vs {final_ppg_2}"
+                f"  {row.player_1}({row.rank_1:g}) vs {row.player_2}({row.rank_2:g}), {row.sos_1:g} vs {row.sos_2:g}, {row.final_ppg_1:g} vs {row.final_ppg_2:g}"
             )
 
-        if (
-            sos_1 < sos_2
-            and final_ppg_1 > final_ppg_2
-            or sos_2 < sos_1
-            and final_ppg_2 > final_ppg_1
-        ):
-            sos_correct += 1
-        else:
-            sos_wrong += 1
-
+    sos_correct = int(comparisons["sos_correct"].sum())
+    sos_wrong = len(comparisons) - sos_correct
     print(f"Position: {position}, SOS Correct: {sos_correct}, SOS Wrong: {sos_wrong}")
     print()
+    return comparisons
 
 
-def plot_sos(df: pd.DataFrame) -> None:
-    set_window_position()
+def _get_plot_sos_df(df: pd.DataFrame) -> pd.DataFrame:
     position = df["POS"].iloc[0]
 
     # drop any row with nans for PPR_AVG_RK or FULL_SOS or Final_PPG
     df = df.dropna(subset=[RANK_STRING, "FULL_SOS", "Final_PPG"])
     if position == "WR":
         # only keep the top 64 WRs based on rank
-        df = df.nsmallest(64, RANK_STRING)
-    else:
-        # only keep the top 32 players for other positions
-        df = df.nsmallest(32, RANK_STRING)
+        return df.nsmallest(64, RANK_STRING)
+    # only keep the top 32 players for other positions
+    return df.nsmallest(32, RANK_STRING)
+
+
+def draw_sos(ax: "Axes", df: pd.DataFrame):
+    # matplotlib is only imported when drawing, the analysis itself doesn't need it
+    import matplotlib
+    from matplotlib import colors
 
     avg_pos_rank = df[RANK_STRING]
     full_sos = df["FULL_SOS"]
     final_points = df["Final_PPG"]
 
     # create a 2D scatter plot: x=avg_pos_rank, y=full_sos, color by final_points (PPG)
-    ax = plt.gca()
     norm = colors.Normalize(final_points.min(), final_points.max())
-    cmap = plt.get_cmap("RdYlGn")
+    cmap = matplotlib.colormaps["RdYlGn"]
     # Scale point size by PPG (final_points)
     min_size = 40
     max_size = 200
@@ -117,6 +197,22 @@ def plot_sos(df: pd.DataFrame) -> None:
         edgecolor="k",
         alpha=0.8,
     )
+    ax.figure.colorbar(scatter, ax=ax, label="Final PPG")
+    ax.set_ylabel("AVG Pos Rank")
+    ax.set_xlabel("Full SOS")
+    ax.set_title(f"SOS Analysis - {df['POS'].iloc[0]}")
+    ax.grid()
+    return scatter
+
+
+def plot_sos(df: pd.DataFrame) -> None:
+    import matplotlib.pyplot as plt
+    import mplcursors
+
+    set_window_position()
+    df = _get_plot_sos_df(df)
+    scatter = draw_sos(plt.gca(), df)
+
     # Add interactive hover labels using mplcursors
     player_names = df["PLAYER NAME"].values
     cursor = mplcursors.cursor(scatter, hover=True)
@@ -127,18 +223,157 @@ def plot_sos(df: pd.DataFrame) -> None:
         sel.annotation.set_text(player_names[idx])
         sel.annotation.get_bbox_patch().set(fc="yellow", alpha=0.8)
 
-    cbar = plt.colorbar(scatter, ax=ax, label="Final PPG")
-    ax.set_ylabel("AVG Pos Rank")
-    ax.set_xlabel("Full SOS")
-    plt.title(f"SOS Analysis - {df['POS'].iloc[0]}")
     plt.tight_layout()
-    plt.grid()
     plt.show()
 
 
-def main() -> None:
-    master_df = get_master_df(ppr=PPR, year=YEAR)
-    position_dfs = split_by_position(master_df)
+def get_sos_image_path(
+    output_dir: str, year: int, ppr: bool, position: str, image_format: str
+) -> str:
+    ppr_string = "ppr" if ppr else "standard"
+    return os.path.join(
+        output_dir, "sos", str(year), ppr_string, f"{position}.{image_format}"
+    )
+
+
+def _save_sos_plot(task: typing.Tuple[pd.DataFrame, str]) -> None:
+    df, image_path = task
+    from matplotlib.figure import Figure
+
+    # object oriented api with the default Agg canvas, no windows are opened
+    fig = Figure()
+    draw_sos(fig.add_subplot(), df)
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    with stage("savefig"):
+        fig.savefig(image_path)
+
+
+def save_sos_plots(
+    position_dfs: typing.Dict[str, pd.DataFrame],
+    output_dir: str,
+    image_format: str,
+    jobs: int,
+) -> None:
+    tasks = [
+        (
+            _get_plot_sos_df(df),
+            get_sos_image_path(output_dir, YEAR, PPR, position, image_format),
+        )
+        for position, df in position_dfs.items()
+    ]
+    print(f"Saving {len(tasks)} plots to {output_dir}")
+    with stage("save_sos_plots") as timed:
+        timed.set_shape(tasks)
+        if jobs == 1:
+            for task in tasks:
+                _save_sos_plot(task)
+            return
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # consume the iterator so worker exceptions are raised here
+            list(executor.map(_save_sos_plot, tasks))
+
+
+def _sweep_year(
+    task: typing.Tuple[
+        int, bool, typing.List[str], typing.List[float], typing.List[float], bool
+    ],
+) -> pd.DataFrame:
+    year, ppr, positions, min_sos_differences, max_rank_differences, adjacent_only = (
+        task
+    )
+    if not has_final_finish(ppr, year):
+        print(f"Skipping 20{year}, no Final_PPG available")
+        return pd.DataFrame()
+    master_df = get_master_df(ppr=ppr, year=year, columns=SOS_COLUMNS)
+
+    # every threshold combination as flat arrays so all of them are evaluated at once
+    min_sos_grid, max_rank_grid = (
+        grid.ravel() for grid in np.meshgrid(min_sos_differences, max_rank_differences)
+    )
+    results = []
+    for position, df in split_by_position(master_df).items():
+        if position not in positions:
+            continue
+        # build the pairs once for the widest rank window, then filter per threshold
+        ranked_df = get_ranked_sos_df(df)
+        with stage("get_sos_comparisons") as timed:
+            comparisons = get_sos_comparisons(
+                ranked_df,
+                min_sos_difference=0,
+                max_rank_difference=max(max_rank_differences),
+                adjacent_only=adjacent_only,
+            )
+            timed.set_shape(ranked_df)
+        in_threshold = in_sos_thresholds(
+            comparisons["rank_difference"].to_numpy(),
+            comparisons["sos_difference"].to_numpy(),
+            min_sos_grid[:, None],
+            max_rank_grid[:, None],
+        )
+        pair_counts = in_threshold.sum(axis=1)
+        correct = (in_threshold & comparisons["sos_correct"].to_numpy()).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            accuracy = correct / pair_counts
+        results.append(
+            pd.DataFrame(
+                {
+                    "year": year,
+                    "scoring": "PPR" if ppr else "Standard",
+                    "position": position,
+                    "min_sos_difference": min_sos_grid,
+                    "max_rank_difference": max_rank_grid,
+                    "sos_correct": correct,
+                    "sos_wrong": pair_counts - correct,
+                    "accuracy": accuracy,
+                }
+            )
+        )
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+
+def sweep_sos_thresholds(
+    years: typing.List[int],
+    ppr_options: typing.List[bool],
+    positions: typing.List[str],
+    min_sos_differences: typing.List[float],
+    max_rank_differences: typing.List[float],
+    adjacent_only: bool,
+    jobs: int,
+) -> pd.DataFrame:
+    # each (year, ppr) frame is loaded once by a worker, which evaluates the whole grid
+    tasks = [
+        (
+            year,
+            ppr,
+            positions,
+            min_sos_differences,
+            max_rank_differences,
+            adjacent_only,
+        )
+        for year, ppr in itertools.product(years, ppr_options)
+    ]
+    if jobs == 1:
+        results = [_sweep_year(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_sweep_year, tasks))
+    return pd.concat(results, ignore_index=True)
+
+
+def run_analysis(
+    positions: typing.List[str],
+    save: bool = False,
+    output_dir: str = "images",
+    image_format: str = "png",
+    jobs: int = 1,
+) -> None:
+    master_df = get_master_df(ppr=PPR, year=YEAR, columns=SOS_COLUMNS)
+    position_dfs = {
+        position: df
+        for position, df in split_by_position(master_df).items()
+        if position in positions
+    }
     print(
         f"Comparing pairs of players with a max position rank difference of {MAX_RANK_DIFFERENCE}"
     )
@@ -149,7 +384,101 @@ def main() -> None:
     for position, df in position_dfs.items():
         print(f"Analyzing position: {position} {PPR_STRING} 20{YEAR}")
         is_sos_a_good_deciding_factor(df, show_comparisons=False)
-        plot_sos(df)
+        if not save:
+            plot_sos(df)
+
+    if save:
+        save_sos_plots(position_dfs, output_dir, image_format, jobs)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="Evaluate a grid of SOS thresholds instead of plotting",
+    )
+    parser.add_argument("--years", type=int, nargs="+", default=SWEEP_YEARS)
+    parser.add_argument(
+        "--scoring", nargs="+", choices=["ppr", "standard"], default=["ppr", "standard"]
+    )
+    parser.add_argument("--positions", nargs="+", choices=POSITIONS, default=POSITIONS)
+    parser.add_argument(
+        "--min-sos-differences",
+        type=float,
+        nargs="+",
+        default=SWEEP_MIN_SOS_DIFFERENCES,
+    )
+    parser.add_argument(
+        "--max-rank-differences",
+        type=float,
+        nargs="+",
+        default=SWEEP_MAX_RANK_DIFFERENCES,
+    )
+    parser.add_argument(
+        "--all-pairs",
+        action="store_true",
+        help="Compare every pair within the rank window, not just neighbors",
+    )
+    parser.add_argument(
+        "--save",
+        action="store_true",
+        help="Save the SOS plots to disk instead of showing interactive windows",
+    )
+    parser.add_argument("--output-dir", default="images")
+    parser.add_argument("--format", choices=["png", "svg"], default="png")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default="sos_sweep.csv")
+    parser.add_argument(
+        "--profile",
+        metavar="TRACE_PATH",
+        help="Time every pipeline stage, print a summary and write a Chrome trace "
+        "to TRACE_PATH",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Also track the peak allocation of every stage with --profile (slower)",
+    )
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    if args.profile:
+        enable_profiling(args.profile, trace_memory=args.profile_memory)
+
+    if not args.sweep:
+        run_analysis(
+            args.positions,
+            save=args.save,
+            output_dir=args.output_dir,
+            image_format=args.format,
+            jobs=args.jobs,
+        )
+        return
+
+    sweep_df = sweep_sos_thresholds(
+        years=args.years,
+        ppr_options=[scoring == "ppr" for scoring in args.scoring],
+        positions=args.positions,
+        min_sos_differences=args.min_sos_differences,
+        max_rank_differences=args.max_rank_differences,
+        adjacent_only=not args.all_pairs,
+        jobs=args.jobs,
+    )
+    if sweep_df.empty:
+        # every season was skipped, there is nothing to save or rank
+        raise SystemExit(
+            f"No threshold results: no season of 20{', 20'.join(map(str, args.years))} "
+            f"has Final_PPG for {', '.join(args.positions)}"
+        )
+    sweep_df.to_csv(args.output, index=False)
+    print(f"Saved {len(sweep_df)} threshold results to {args.output}")
+    print(sweep_df.sort_values(by="accuracy", ascending=False).head(10))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Strength of schedule analysis.")
+    add_arguments(parser)
+    run(parser.parse_args(), parser)
 
 
 if __name__ == "__main__":
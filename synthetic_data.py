@@ -0,0 +1,286 @@
+import argparse
+import csv
+import os
+import typing
+
+import numpy as np
+import pandas as pd
+
+from utilities import DATA_DIR, STRING_COLUMNS
+from weekly_points import WEEK_COLUMNS
+
+# synthetic rows are jittered copies of rows from this year's master sheet
+TEMPLATE_YEAR = 24
+POSITIONS = ["QB", "RB", "WR", "TE", "K", "DEF"]
+FINISH_POSITIONS = {"DEF": "DST"}
+# standard scoring keeps this share of a player's ppr points
+STANDARD_SHARE = {"RB": 0.85, "WR": 0.75, "TE": 0.75}
+# spread of the multiplicative noise applied to every stat
+STAT_NOISE = 0.15
+# share of players replaced by new players every season
+PLAYER_TURNOVER = 0.2
+# share of players that change teams every season
+TEAM_CHANGE = 0.1
+# share of master sheet players without a finish, and extra finishes of unlisted players
+MISSING_FINISH = 0.15
+EXTRA_FINISH = 0.05
+MISSED_GAME = 0.08
+# shape of the gamma noise of weekly points around a player's mean
+WEEKLY_POINTS_SHAPE = 3.0
+
+
+class Template(typing.NamedTuple):
+    # raw master sheet cells, so generated files keep the exact column order and formats
+    cells: pd.DataFrame
+    numeric_columns: typing.List[str]
+    # float64 (rows x numeric columns), NaN for blank and text cells
+    values: np.ndarray
+    # digits after the decimal point of every numeric column
+    decimals: typing.List[int]
+    percent: np.ndarray
+
+
+def load_template(year: int = TEMPLATE_YEAR) -> Template:
+    df = pd.read_csv(
+        os.path.join(DATA_DIR, f"master_sheet_{year}.csv"),
+        dtype=str,
+        keep_default_na=False,
+    )
+    df = df[df["POS"].isin(POSITIONS)].reset_index(drop=True)
+    numeric_columns = [col for col in df.columns if col not in STRING_COLUMNS]
+    numeric_cells = df[numeric_columns]
+    values = numeric_cells.apply(
+        lambda column: pd.to_numeric(column.str.rstrip("%"), errors="coerce")
+    )
+    decimals = [
+        numeric_cells[col].str.extract(r"\.(\d+)%?$")[0].str.len().max()
+        for col in numeric_columns
+    ]
+    return Template(
+        cells=df,
+        numeric_columns=numeric_columns,
+        values=values.to_numpy(dtype=np.float64),
+        decimals=[0 if pd.isna(d) else int(d) for d in decimals],
+        percent=numeric_cells.apply(lambda column: column.str.endswith("%")).to_numpy(),
+    )
+
+
+def _make_names(count: int, template: Template, rng: np.random.Generator) -> np.ndarray:
+    # first and last names of the template players mixed together, numbered when taken
+    names = template.cells["PLAYER NAME"].str.split(" ", n=1)
+    first_names = names.str[0].unique()
+    last_names = names.str[1].dropna().unique()
+    generated = pd.Series(
+        rng.choice(first_names, count) + " " + rng.choice(last_names, count)
+    )
+    taken = generated.groupby(generated).cumcount()
+    numbered = generated + " " + (taken + 1).astype(str)
+    return np.where(taken > 0, numbered, generated)
+
+
+def _jitter_stats(
+    template: Template, template_rows: np.ndarray, rng: np.random.Generator
+) -> pd.DataFrame:
+    # every numeric cell is scaled by random noise and written back in its own format,
+    # blank, "%" and text cells stay blank, "%" and text
+    rows = template.cells.iloc[template_rows].reset_index(drop=True)
+    values = template.values[template_rows]
+    jittered = values * rng.lognormal(0, STAT_NOISE, values.shape)
+    present = ~np.isnan(values)
+    percent = template.percent[template_rows]
+    columns = {}
+    for i, col in enumerate(template.numeric_columns):
+        if not present[:, i].any():
+            continue
+        column = np.round(jittered[:, i], template.decimals[i])
+        if template.decimals[i] == 0:
+            column = np.nan_to_num(column).astype(np.int64)
+        formatted = np.char.add(column.astype(str), np.where(percent[:, i], "%", ""))
+        columns[col] = np.where(present[:, i], formatted, rows[col].to_numpy())
+    return rows.assign(**columns)
+
+
+class PlayerPool(typing.NamedTuple):
+    names: np.ndarray
+    positions: np.ndarray
+    teams: np.ndarray
+    # template row every player's stats are drawn from
+    template_rows: np.ndarray
+
+
+def _new_players(
+    count: int, names: np.ndarray, template: Template, rng: np.random.Generator
+) -> PlayerPool:
+    template_rows = rng.integers(0, len(template.cells), count)
+    return PlayerPool(
+        names=names,
+        positions=template.cells["POS"].to_numpy()[template_rows],
+        teams=template.cells["TEAM"].to_numpy()[template_rows],
+        template_rows=template_rows,
+    )
+
+
+def _next_season(
+    pool: PlayerPool,
+    new_names: np.ndarray,
+    template: Template,
+    rng: np.random.Generator,
+) -> PlayerPool:
+    # replace some players with new ones and move some players to other teams
+    replaced = np.flatnonzero(rng.random(len(pool.names)) < PLAYER_TURNOVER)
+    replaced = replaced[: len(new_names)]
+    new_players = _new_players(len(replaced), new_names[: len(replaced)], template, rng)
+    pool = PlayerPool(*(np.array(field, copy=True) for field in pool))
+    for field, new_values in zip(PlayerPool._fields, new_players):
+        getattr(pool, field)[replaced] = new_values
+    moved = rng.random(len(pool.names)) < TEAM_CHANGE
+    teams = template.cells["TEAM"].replace("", np.nan).dropna().unique()
+    pool.teams[moved] = rng.choice(teams, moved.sum())
+    return pool
+
+
+def generate_master_sheet(
+    pool: PlayerPool, template: Template, rng: np.random.Generator
+) -> pd.DataFrame:
+    rows = _jitter_stats(template, pool.template_rows, rng)
+    rows["PLAYER NAME"] = pool.names
+    rows["POS"] = pool.positions
+    rows["TEAM"] = pool.teams
+    return rows
+
+
+def _get_mean_points(master_df: pd.DataFrame, column: str) -> np.ndarray:
+    # last season's points per game drive this season's, rookies get a position average
+    points = pd.to_numeric(master_df[column], errors="coerce").replace(0, np.nan)
+    position_means = points.groupby(master_df["POS"]).transform("mean")
+    return points.fillna(position_means).fillna(points.mean()).to_numpy()
+
+
+def generate_weekly_points(
+    master_df: pd.DataFrame,
+    extra_names: np.ndarray,
+    template: Template,
+    rng: np.random.Generator,
+) -> typing.Dict[str, pd.DataFrame]:
+    # FantasyPros style weekly points for both scoring types, keyed on "ppr"/"standard"
+    finished = rng.random(len(master_df)) >= MISSING_FINISH
+    players = master_df.loc[finished, ["PLAYER NAME", "POS", "TEAM"]]
+    ppr_points = _get_mean_points(master_df, "PPR_AVG_FAN PTS")[finished]
+    # players that aren't in the master sheet, like the real finish files have
+    extra_players = generate_master_sheet(
+        _new_players(len(extra_names), extra_names, template, rng), template, rng
+    )
+    players = pd.concat(
+        [players, extra_players[["PLAYER NAME", "POS", "TEAM"]]], ignore_index=True
+    )
+    ppr_points = np.concatenate(
+        [ppr_points, _get_mean_points(extra_players, "PPR_AVG_FAN PTS")]
+    )
+
+    # gamma noise around every player's mean, one bye and a few missed games each
+    shape = (len(players), len(WEEK_COLUMNS))
+    weekly_ppr = ppr_points[:, None] * rng.gamma(
+        WEEKLY_POINTS_SHAPE, 1 / WEEKLY_POINTS_SHAPE, shape
+    )
+    byes = rng.integers(5, 15, len(players))
+    bye = np.arange(1, len(WEEK_COLUMNS) + 1) == byes[:, None]
+    missed = (rng.random(shape) < MISSED_GAME) & ~bye
+    standard_share = players["POS"].map(STANDARD_SHARE).fillna(1).to_numpy()
+
+    weekly_dfs = {}
+    for scoring, share in [("ppr", 1.0), ("standard", standard_share)]:
+        weekly = np.round(weekly_ppr * np.reshape(share, (-1, 1)), 1)
+        played = ~bye & ~missed
+        total = np.where(played, weekly, 0).sum(axis=1).round(1)
+        games = np.maximum(played.sum(axis=1), 1)
+        cells = np.where(bye, "BYE", np.where(missed, "-", weekly.astype(str)))
+        df = pd.DataFrame(cells, columns=WEEK_COLUMNS)
+        df.insert(0, "Player", players["PLAYER NAME"].to_numpy())
+        df.insert(1, "Pos", players["POS"].replace(FINISH_POSITIONS).to_numpy())
+        df.insert(2, "Team", players["TEAM"].to_numpy())
+        df["AVG"] = np.round(total / games, 1)
+        df["TTL"] = total
+        df = df.sort_values(by="TTL", ascending=False, kind="stable")
+        df.insert(0, "#", np.arange(1, len(df) + 1))
+        weekly_dfs[scoring] = df.reset_index(drop=True)
+    return weekly_dfs
+
+
+def write_synthetic_data(
+    output_dir: str,
+    players: int,
+    years: typing.List[int],
+    seed: int = 0,
+    template_year: int = TEMPLATE_YEAR,
+) -> typing.List[str]:
+    # master sheets and weekly finish files of a synthetic league, one set per year
+    rng = np.random.default_rng(seed)
+    template = load_template(template_year)
+    # every name is drawn up front so players never share a name across seasons
+    new_per_season = int(players * PLAYER_TURNOVER * 2) + 1
+    extra_per_season = int(players * EXTRA_FINISH)
+    names = _make_names(
+        players + (new_per_season + extra_per_season) * len(years), template, rng
+    )
+    pool = _new_players(players, names[:players], template, rng)
+    next_name = players
+
+    os.makedirs(output_dir, exist_ok=True)
+    file_paths = []
+    for i, year in enumerate(years):
+        if i > 0:
+            pool = _next_season(
+                pool, names[next_name : next_name + new_per_season], template, rng
+            )
+            next_name += new_per_season
+        master_df = generate_master_sheet(pool, template, rng)
+        extra_names = names[next_name : next_name + extra_per_season]
+        next_name += extra_per_season
+        weekly_dfs = generate_weekly_points(master_df, extra_names, template, rng)
+
+        master_path = os.path.join(output_dir, f"master_sheet_{year}.csv")
+        master_df.to_csv(master_path, index=False)
+        file_paths.append(master_path)
+        for scoring, weekly_df in weekly_dfs.items():
+            # the raw download has mixed case names and quotes every cell,
+            # the converted file has the master sheet's upper case names
+            raw_path = os.path.join(
+                output_dir, f"FantasyPros_Fantasy_Football_Points_{scoring}_{year}.csv"
+            )
+            raw_df = weekly_df.assign(Player=weekly_df["Player"].str.title())
+            raw_df.to_csv(raw_path, index=False, quoting=csv.QUOTE_ALL)
+            converted_path = os.path.join(
+                output_dir, f"fp_converted_names_{scoring}_{year}.csv"
+            )
+            weekly_df.to_csv(converted_path, index=False)
+            file_paths += [raw_path, converted_path]
+    return file_paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic master sheets and FantasyPros weekly points "
+        "files for scale testing."
+    )
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument(
+        "--players", type=int, default=10_000, help="Players in every master sheet"
+    )
+    parser.add_argument(
+        "--seasons", type=int, default=1, help="Number of consecutive seasons"
+    )
+    parser.add_argument(
+        "--first-year", type=int, default=24, help="Two digit year of the first season"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.abspath(args.output_dir) == os.path.abspath(DATA_DIR):
+        parser.error("refusing to overwrite the real data files")
+    years = list(range(args.first_year, args.first_year + args.seasons))
+    file_paths = write_synthetic_data(args.output_dir, args.players, years, args.seed)
+    print(f"Wrote {len(file_paths)} files to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
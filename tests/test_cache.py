@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import shutil
+
+import pytest
+
+import feature_cube
+import player_index
+import utilities
+from feature_cube import CUBE_FORMAT_VERSION, get_feature_cube
+from weekly_points import get_weekly_points
+
+# the checked in data, read before the fixture points the loaders somewhere else
+REPO_DATA_DIR = utilities.DATA_DIR
+YEAR = 24
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # a copy of one season, forked workers inherit the patched paths
+    for file_name in [
+        f"master_sheet_{YEAR}.csv",
+        f"fp_converted_names_ppr_{YEAR}.csv",
+        f"fp_converted_names_standard_{YEAR}.csv",
+        "player_ids.csv",
+    ]:
+        shutil.copy(os.path.join(REPO_DATA_DIR, file_name), tmp_path)
+    monkeypatch.setattr(utilities, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(utilities, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(
+        player_index, "PLAYER_INDEX_PATH", str(tmp_path / "player_ids.csv")
+    )
+    return tmp_path
+
+
+def load_master_rows(_: int) -> int:
+    return len(utilities.get_master_df(ppr=True, year=YEAR))
+
+
+def run_concurrently(function) -> list:
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        return pool.map(function, range(4))
+
+
+def test_concurrent_cold_master_loads(data_dir):
+    rows = run_concurrently(load_master_rows)
+    assert len(set(rows)) == 1
+    cache_files = os.listdir(utilities.CACHE_DIR)
+    assert [name for name in cache_files if name.endswith(".parquet")] == [
+        f"master_{YEAR}_ppr_{utilities.get_data_version(True, YEAR)}.parquet"
+    ]
+    assert not [name for name in cache_files if name.endswith(".tmp")]
+
+
+def load_stacked_rows(_: int) -> int:
+    return len(utilities.get_stacked_df())
+
+
+def test_concurrent_cold_stacked_loads(data_dir):
+    rows = run_concurrently(load_stacked_rows)
+    assert len(set(rows)) == 1
+    assert [
+        name
+        for name in os.listdir(utilities.CACHE_DIR)
+        if name.startswith(utilities.STACKED_CACHE_PREFIX)
+    ] == [f"{utilities.STACKED_CACHE_PREFIX}{utilities.get_stacked_data_version()}"]
+
+
+def load_weekly_players(_: int) -> int:
+    return len(get_weekly_points(ppr=True, year=YEAR).player_ids)
+
+
+def test_concurrent_cold_weekly_loads(data_dir):
+    players = run_concurrently(load_weekly_players)
+    assert len(set(players)) == 1
+    assert not [name for name in os.listdir(utilities.CACHE_DIR) if ".tmp" in name]
+
+
+def load_cube_shape(_: int) -> tuple:
+    return get_feature_cube().values.shape
+
+
+def test_concurrent_cold_feature_cube_loads(data_dir):
+    shapes = run_concurrently(load_cube_shape)
+    assert len(set(shapes)) == 1
+    assert not [name for name in os.listdir(utilities.CACHE_DIR) if ".tmp" in name]
+
+
+def test_feature_cube_format_version_rebuilds_old_cubes(data_dir, monkeypatch):
+    get_feature_cube()
+    monkeypatch.setattr(feature_cube, "CUBE_FORMAT_VERSION", CUBE_FORMAT_VERSION + 1)
+    get_feature_cube()
+    cube_files = [
+        name
+        for name in os.listdir(utilities.CACHE_DIR)
+        if name.startswith(feature_cube.FEATURE_CUBE_PREFIX)
+    ]
+    assert sorted(cube_files) == [
+        f"{feature_cube.FEATURE_CUBE_PREFIX}v{CUBE_FORMAT_VERSION + 1}_"
+        f"{utilities.get_stacked_data_version()}{extension}"
+        for extension in [".json", ".npy"]
+    ]
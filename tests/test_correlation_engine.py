@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import NON_FEATURE_COLUMNS
+from correlation_engine import correlation_matrix, cutoff_pearson, pearson_matrix
+from utilities import get_master_df, split_by_position
+
+
+def get_missing_value_frame(seed: int) -> pd.DataFrame:
+    # columns with ties and different patterns of missing values, one without any
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.integers(0, 8, size=(60, 6)).astype(np.float64))
+    for column in range(1, 6):
+        df.loc[rng.random(60) < 0.1 * column, column] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_spearman_matches_pandas_with_missing_values(seed):
+    df = get_missing_value_frame(seed)
+    values = df.to_numpy()
+    np.testing.assert_allclose(
+        correlation_matrix(values, values, "spearman"),
+        df.corr(method="spearman").to_numpy(),
+        atol=1e-12,
+    )
+    # targets with their own missing values
+    np.testing.assert_allclose(
+        correlation_matrix(values[:, :4], values[:, 4:], "spearman"),
+        df.corr(method="spearman").to_numpy()[:4, 4:],
+        atol=1e-12,
+    )
+
+
+def test_spearman_matches_pandas_on_quarterbacks():
+    # WORST_RK is missing for some QBs, ranking Final_PPG over every QB was off by 0.03
+    qb_df = split_by_position(get_master_df(ppr=True, year=24, use_cache=False))["QB"]
+    numeric_df = qb_df.drop(columns=NON_FEATURE_COLUMNS).astype(np.float64)
+    assert numeric_df["WORST_RK"].isna().any()
+    expected = numeric_df.corr(method="spearman")["Final_PPG"]
+    correlations = correlation_matrix(
+        numeric_df.to_numpy(), numeric_df["Final_PPG"].to_numpy(), "spearman"
+    )[:, 0]
+    np.testing.assert_allclose(correlations, expected.to_numpy(), atol=1e-12)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_pearson_matches_pandas_with_missing_values(seed):
+    df = get_missing_value_frame(seed)
+    values = df.to_numpy()
+    np.testing.assert_allclose(
+        pearson_matrix(values, values), df.corr().to_numpy(), atol=1e-12
+    )
+
+
+def test_cutoff_pearson_matches_pearson_of_every_prefix():
+    values = get_missing_value_frame(0).to_numpy()
+    cutoffs = [5, 20, 60]
+    expected = [
+        pearson_matrix(values[:cutoff], values[:cutoff, 0])[:, 0] for cutoff in cutoffs
+    ]
+    np.testing.assert_allclose(
+        cutoff_pearson(values, values[:, 0], cutoffs), expected, atol=1e-12
+    )
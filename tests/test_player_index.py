@@ -0,0 +1,104 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import player_index
+import utilities
+from player_index import build_player_index, get_player_ids, load_player_index
+from weekly_points import get_weekly_points
+
+# the checked in data, read before the fixture points the loaders somewhere else
+REPO_DATA_DIR = utilities.DATA_DIR
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # loaders and the player index pointed at an empty data directory
+    monkeypatch.setattr(utilities, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(utilities, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(
+        player_index, "PLAYER_INDEX_PATH", str(tmp_path / "player_ids.csv")
+    )
+    return tmp_path
+
+
+def write_master_sheet(data_dir, year, rows):
+    pd.DataFrame(rows, columns=["PLAYER NAME", "POS", "TEAM"]).to_csv(
+        data_dir / f"master_sheet_{year}.csv", index=False
+    )
+
+
+def get_ids(rows):
+    df = pd.DataFrame(rows, columns=["name", "pos", "team"])
+    return get_player_ids(df["name"], df["pos"], df["team"]).tolist()
+
+
+def test_same_name_and_position_on_different_teams_get_their_own_ids(data_dir):
+    write_master_sheet(
+        data_dir,
+        23,
+        [
+            ["JOSH ALLEN", "QB", "BUF"],
+            ["JOSH ALLEN", "QB", "JAX"],
+            ["A B", "WR", "NYJ"],
+        ],
+    )
+    assert build_player_index() == 3
+    buf_id, jax_id, wr_id = get_ids(
+        [["JOSH ALLEN", "QB", "BUF"], ["JOSH ALLEN", "QB", "JAX"], ["A B", "WR", "NYJ"]]
+    )
+    assert len({buf_id, jax_id, wr_id}) == 3
+
+    # a player whose name and position are unique keeps their id on a new team,
+    # an ambiguous name on a new team is a new player
+    write_master_sheet(
+        data_dir, 24, [["A B", "WR", "MIA"], ["JOSH ALLEN", "QB", "MIA"]]
+    )
+    assert build_player_index() == 2
+    moved_id, new_id = get_ids([["A B", "WR", "MIA"], ["JOSH ALLEN", "QB", "MIA"]])
+    assert moved_id == wr_id
+    assert new_id not in {buf_id, jax_id, wr_id}
+
+    # building again adds nothing and keeps every id
+    index_df = load_player_index()
+    assert build_player_index() == 0
+    pd.testing.assert_frame_equal(load_player_index(), index_df)
+
+
+def test_unknown_players_raise_without_writing_the_index(data_dir):
+    write_master_sheet(data_dir, 23, [["A B", "WR", "NYJ"]])
+    build_player_index()
+    with open(player_index.PLAYER_INDEX_PATH, "rb") as f:
+        stored = f.read()
+    with pytest.raises(KeyError, match="C D"):
+        get_ids([["A B", "WR", "NYJ"], ["C D", "RB", "NYJ"]])
+    with open(player_index.PLAYER_INDEX_PATH, "rb") as f:
+        assert f.read() == stored
+
+
+def test_loaders_only_read_the_index(data_dir):
+    for file_name in [
+        "master_sheet_24.csv",
+        "fp_converted_names_ppr_24.csv",
+        "player_ids.csv",
+    ]:
+        shutil.copy(os.path.join(REPO_DATA_DIR, file_name), data_dir)
+    index_stat = os.stat(player_index.PLAYER_INDEX_PATH)
+    master_df = utilities.get_master_df(ppr=True, year=24)
+    weekly_points = get_weekly_points(ppr=True, year=24)
+    assert os.stat(player_index.PLAYER_INDEX_PATH).st_mtime_ns == index_stat.st_mtime_ns
+    assert set(weekly_points.player_ids) & set(master_df["PLAYER_ID"])
+
+
+def test_cache_key_changes_with_the_player_index(data_dir):
+    write_master_sheet(data_dir, 23, [["A B", "WR", "NYJ"]])
+    build_player_index()
+    data_version = utilities.get_data_version(ppr=True, year=23)
+    stacked_data_version = utilities.get_stacked_data_version()
+    index_df = load_player_index()
+    index_df["player_id"] += 1
+    index_df.to_csv(player_index.PLAYER_INDEX_PATH, index=False)
+    assert utilities.get_data_version(ppr=True, year=23) != data_version
+    assert utilities.get_stacked_data_version() != stacked_data_version
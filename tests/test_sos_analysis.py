@@ -0,0 +1,162 @@
+import argparse
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import player_index
+import utilities
+from sos_analysis import (
+    RANK_STRING,
+    SOS_COLUMNS,
+    SWEEP_MAX_RANK_DIFFERENCES,
+    SWEEP_MIN_SOS_DIFFERENCES,
+    add_arguments,
+    get_ranked_sos_df,
+    get_sos_comparisons,
+    run,
+    sweep_sos_thresholds,
+)
+from utilities import get_master_df, split_by_position
+
+
+def count_adjacent_comparisons(
+    df: pd.DataFrame, min_sos_difference: float, max_rank_difference: float
+) -> tuple:
+    # the original row by row loop over neighbors, (correct, wrong)
+    sos_correct = 0
+    sos_wrong = 0
+    for i in range(1, len(df)):
+        rank_1, rank_2 = df.iloc[i - 1][RANK_STRING], df.iloc[i][RANK_STRING]
+        if rank_2 - rank_1 > max_rank_difference:
+            continue
+        sos_1, sos_2 = df.iloc[i - 1]["FULL_SOS"], df.iloc[i]["FULL_SOS"]
+        final_ppg_1, final_ppg_2 = df.iloc[i - 1]["Final_PPG"], df.iloc[i]["Final_PPG"]
+        if abs(sos_1 - sos_2) < min_sos_difference:
+            continue
+        if (
+            sos_1 < sos_2
+            and final_ppg_1 > final_ppg_2
+            or sos_2 < sos_1
+            and final_ppg_2 > final_ppg_1
+        ):
+            sos_correct += 1
+        else:
+            sos_wrong += 1
+    return sos_correct, sos_wrong
+
+
+def get_ranked_df(year: int, ppr: bool, position: str) -> pd.DataFrame:
+    master_df = get_master_df(ppr=ppr, year=year, use_cache=False, columns=SOS_COLUMNS)
+    return get_ranked_sos_df(split_by_position(master_df)[position])
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("adjacent_only", [True, False])
+def test_rank_and_sos_differences_on_the_threshold_are_kept(dtype, adjacent_only):
+    # 16.2 - 15.2 is 1.000001 in float32, it is still a rank difference of 1
+    df = pd.DataFrame(
+        {
+            "PLAYER NAME": ["A", "B", "C"],
+            RANK_STRING: np.array([15.2, 16.2, 17.3], dtype=dtype),
+            "FULL_SOS": np.array([5.1, 25.1, 0.3], dtype=dtype),
+            "Final_PPG": np.array([15.0, 12.0, 14.0], dtype=np.float32),
+        }
+    )
+    comparisons = get_sos_comparisons(
+        df, min_sos_difference=20, max_rank_difference=1, adjacent_only=adjacent_only
+    )
+    assert comparisons[["player_1", "player_2"]].values.tolist() == [["A", "B"]]
+    assert comparisons["sos_correct"].tolist() == [True]
+
+
+@pytest.mark.parametrize("adjacent_only", [True, False])
+def test_boundary_pair_matches_the_original_loop(adjacent_only):
+    df = get_ranked_df(24, True, "RB")
+    comparisons = get_sos_comparisons(
+        df, min_sos_difference=20, max_rank_difference=1, adjacent_only=adjacent_only
+    )
+    assert ["JOE MIXON", "KENNETH WALKER"] in comparisons[
+        ["player_1", "player_2"]
+    ].values.tolist()
+    if adjacent_only:
+        sos_correct = int(comparisons["sos_correct"].sum())
+        assert (sos_correct, len(comparisons) - sos_correct) == (
+            count_adjacent_comparisons(df, 20, 1)
+        )
+
+
+@pytest.mark.parametrize("position", ["QB", "RB", "WR", "TE", "DEF", "K"])
+def test_adjacent_pairs_match_the_original_loop(position):
+    df = get_ranked_df(24, True, position)
+    for min_sos_difference, max_rank_difference in [(10, 3), (20, 1), (0, 2)]:
+        comparisons = get_sos_comparisons(df, min_sos_difference, max_rank_difference)
+        sos_correct = int(comparisons["sos_correct"].sum())
+        assert (sos_correct, len(comparisons) - sos_correct) == (
+            count_adjacent_comparisons(df, min_sos_difference, max_rank_difference)
+        )
+
+
+@pytest.mark.parametrize(
+    "year, ppr, position, min_sos_difference, max_rank_difference",
+    [(24, True, "RB", 20, 1), (24, False, "WR", 10, 3), (23, True, "TE", 4, 2)],
+)
+def test_sweep_cell_matches_the_original_loop(
+    year, ppr, position, min_sos_difference, max_rank_difference
+):
+    sweep_df = sweep_sos_thresholds(
+        years=[year],
+        ppr_options=[ppr],
+        positions=[position],
+        min_sos_differences=SWEEP_MIN_SOS_DIFFERENCES,
+        max_rank_differences=SWEEP_MAX_RANK_DIFFERENCES,
+        adjacent_only=True,
+        jobs=1,
+    )
+    cell = sweep_df[
+        (sweep_df["min_sos_difference"] == min_sos_difference)
+        & (sweep_df["max_rank_difference"] == max_rank_difference)
+    ]
+    assert len(cell) == 1
+    df = get_ranked_df(year, ppr, position)
+    assert (int(cell["sos_correct"].iloc[0]), int(cell["sos_wrong"].iloc[0])) == (
+        count_adjacent_comparisons(df, min_sos_difference, max_rank_difference)
+    )
+
+
+def test_sweep_raises_for_players_missing_from_the_index(tmp_path, monkeypatch):
+    # a data error is raised, not reported as a season without Final_PPG
+    for file_name in ["master_sheet_24.csv", "fp_converted_names_ppr_24.csv"]:
+        shutil.copy(os.path.join(utilities.DATA_DIR, file_name), tmp_path)
+    index_df = player_index.load_player_index()
+    index_df[index_df["name"] != "JOE MIXON"].to_csv(
+        tmp_path / "player_ids.csv", index=False
+    )
+    monkeypatch.setattr(utilities, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(utilities, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(
+        player_index, "PLAYER_INDEX_PATH", str(tmp_path / "player_ids.csv")
+    )
+    with pytest.raises(KeyError, match="JOE MIXON"):
+        sweep_sos_thresholds(
+            years=[24],
+            ppr_options=[True],
+            positions=["RB"],
+            min_sos_differences=[0],
+            max_rank_differences=[1],
+            adjacent_only=True,
+            jobs=1,
+        )
+
+
+def test_sweep_without_any_finished_season_exits(tmp_path):
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    args = parser.parse_args(
+        ["--sweep", "--years", "25", "--jobs", "1", "--output", str(tmp_path / "o.csv")]
+    )
+    with pytest.raises(SystemExit, match="No threshold results"):
+        run(args, parser)
+    assert not (tmp_path / "o.csv").exists()
@@ -1,11 +1,23 @@
+import contextlib
+import hashlib
 import os
+import re
+import shutil
 import typing
 
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
+
+import player_index
+from instrumentation import stage
+from player_index import get_player_ids, normalize_names
 
 
 def set_window_position() -> None:
+    # pyplot is only imported for interactive windows, data only callers never load it
+    import matplotlib.pyplot as plt
+
     # Set the position of the matplotlib window to the top left corner of the screen
     manager = plt.get_current_fig_manager()
     if hasattr(manager, "window"):
@@ -16,21 +28,120 @@ def set_window_position() -> None:
         )
 
 
+# columns that hold text, everything else in the master sheet is numeric
+STRING_COLUMNS = ["PLAYER NAME", "POS", "TEAM"]
+# columns stored as "65%" style strings in the master sheet
+PERCENT_COLUMNS = ["AVG_PASS_PCT", "PASS_PCT"]
+# ranks, ADP and SOS are compared against exact thresholds (a rank gap of 1, an SOS
+# gap of 20), and float32 can't hold their one decimal values exactly, so they stay
+# float64. Matches RK, POS_AVG., POS_BEST, STANDARD_ADP, FULL_SOS and their PPR_ forms
+RANK_COLUMN_PATTERN = re.compile(r"(^|_)(RK|ADP|SOS)$|^(PPR_)?POS_")
+
+
+def _coerce_column_types(df: pd.DataFrame) -> pd.DataFrame:
+    # parse percentage columns and downcast numeric columns other than the ranks so
+    # the frame is small and never has numeric data stored as strings
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if col in STRING_COLUMNS:
+            columns[col] = series
+            continue
+        if col in PERCENT_COLUMNS and series.dtype == object:
+            series = series.str.rstrip("%")
+        if series.dtype == object:
+            # stray header rows in older sheets leave text in numeric columns
+            series = pd.to_numeric(series, errors="coerce")
+        if RANK_COLUMN_PATTERN.search(col):
+            series = series.astype(np.float64)
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            small_int = np.iinfo(np.int16)
+            if series.min() >= small_int.min and series.max() <= small_int.max:
+                series = series.astype(np.int16)
+            else:
+                series = series.astype(np.int32)
+        else:
+            series = series.astype(np.float32)
+        columns[col] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def add_player_ids(df: pd.DataFrame) -> pd.DataFrame:
+    # stable integer id per player, keyed on name, position and team
+    df = df.copy()
+    player_ids = get_player_ids(df["PLAYER NAME"], df["POS"], df["TEAM"])
+    df.insert(0, "PLAYER_ID", player_ids.astype(np.int32))
+    return df
+
+
+def get_finish_rows(
+    player_ids: np.ndarray,
+    player_names: pd.Series,
+    finish_ids: np.ndarray,
+    finish_names: pd.Series,
+) -> np.ndarray:
+    # row of the finish data for every player, -1 when the player has no finish
+    # join on player id so players sharing a name at other positions don't collide
+    finish_rows = pd.Series(np.arange(len(finish_ids)), index=finish_ids)
+    finish_rows = finish_rows[~finish_rows.index.duplicated()]
+    rows = finish_rows.reindex(player_ids).to_numpy(dtype=np.float64)
+
+    # players with the wrong position in the master sheet fall back to their name,
+    # as long as only one player in the finish data has that name
+    finish_names = normalize_names(pd.Series(finish_names))
+    finish_rows_by_name = pd.Series(np.arange(len(finish_names)), index=finish_names)
+    finish_rows_by_name = finish_rows_by_name[
+        ~finish_names.duplicated(keep=False).to_numpy()
+    ]
+    missing = np.isnan(rows)
+    player_names = normalize_names(pd.Series(player_names)[missing])
+    rows[missing] = finish_rows_by_name.reindex(player_names).to_numpy()
+    return np.nan_to_num(rows, nan=-1).astype(np.int64)
+
+
 def add_final_finish_to_old_df(
     old_df: pd.DataFrame, final_df: pd.DataFrame
 ) -> pd.DataFrame:
-    # create a dictionary to map player names to their final finish
+    if "PLAYER_ID" not in old_df.columns:
+        old_df = add_player_ids(old_df)
+    else:
+        old_df = old_df.copy()
+    final_ids = get_player_ids(final_df["Player"], final_df["Pos"], final_df["Team"])
+    finish_rows = get_finish_rows(
+        old_df["PLAYER_ID"].to_numpy(),
+        old_df["PLAYER NAME"],
+        final_ids,
+        final_df["Player"],
+    )
     # ignore total points and only use PPG. We don't predict injuries
-    final_ppg_dict = final_df.set_index("Player")["AVG"].to_dict()
-    # add a new column to the old_df with the final finish
-    old_df["Final_PPG"] = old_df["PLAYER NAME"].map(final_ppg_dict)
+    final_ppg = final_df["AVG"].to_numpy(dtype=np.float32)
+    old_df["Final_PPG"] = np.where(
+        finish_rows >= 0, final_ppg[finish_rows], np.float32(np.nan)
+    )
     # drop rows where Final_PPG is NaN
     old_df = old_df[old_df["Final_PPG"].notna()]
     return old_df
 
 
 def split_by_position(df: pd.DataFrame) -> typing.Dict[str, pd.DataFrame]:
-    return {pos: df[df["POS"] == pos] for pos in df["POS"].unique()}
+    # sort once by position and slice out each position's contiguous rows. The slices
+    # are views of the sorted frame, so splitting never scans or copies per position
+    with stage("split_by_position") as timed:
+        codes, positions = pd.factorize(df["POS"], use_na_sentinel=False)
+        if (np.diff(codes) >= 0).all():
+            # rows are already grouped by position in order of appearance
+            sorted_df = df
+            sorted_codes = codes
+        else:
+            order = np.argsort(codes, kind="stable")
+            sorted_df = df.take(order)
+            sorted_codes = codes[order]
+        offsets = np.searchsorted(sorted_codes, np.arange(len(positions) + 1))
+        timed.set_shape(df)
+    return {
+        pos: sorted_df.iloc[offsets[i] : offsets[i + 1]]
+        for i, pos in enumerate(positions)
+    }
 
 
 def _remove_ppr_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -84,33 +195,281 @@ def _fix_standard_adp(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def get_master_df(ppr: bool, year: int) -> pd.DataFrame:
+# bump whenever the preparation in _build_master_df changes so stale caches are rebuilt
+CACHE_SCHEMA_VERSION = 4
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+
+
+def _get_source_files(ppr: bool, year: int) -> typing.List[str]:
     YEAR_STRING = f"_{year}"
     PPR_STRING = "_ppr" if ppr else "_standard"
-    current_dir = os.path.dirname(__file__)
-    df = pd.read_csv(
-        os.path.join(current_dir, "data", f"master_sheet{YEAR_STRING}.csv")
+    master_file = os.path.join(DATA_DIR, f"master_sheet{YEAR_STRING}.csv")
+    final_ppg_file = os.path.join(
+        DATA_DIR, f"fp_converted_names{PPR_STRING}{YEAR_STRING}.csv"
     )
+    return [master_file] + ([final_ppg_file] if os.path.exists(final_ppg_file) else [])
+
+
+def has_final_finish(ppr: bool, year: int) -> bool:
+    # whether the year has a finish file, and so a Final_PPG column
+    return len(_get_source_files(ppr, year)) > 1
+
+
+def _get_cache_key(source_files: typing.List[str]) -> str:
+    # hash the contents of every input file and of the player index, which every
+    # cached frame takes its PLAYER_ID column from, along with the schema version
+    hasher = hashlib.sha256(f"schema_v{CACHE_SCHEMA_VERSION}".encode())
+    if os.path.exists(player_index.PLAYER_INDEX_PATH):
+        source_files = source_files + [player_index.PLAYER_INDEX_PATH]
+    for file_path in source_files:
+        hasher.update(os.path.basename(file_path).encode())
+        with open(file_path, "rb") as f:
+            hasher.update(f.read())
+    return hasher.hexdigest()[:16]
+
+
+def get_data_version(ppr: bool, year: int) -> str:
+    # changes whenever any input file for this year and scoring type changes
+    return _get_cache_key(_get_source_files(ppr, year))
+
+
+def _get_cache_prefix(ppr: bool, year: int) -> str:
+    ppr_string = "ppr" if ppr else "standard"
+    return f"master_{year}_{ppr_string}_"
+
+
+def _write_cache(df: pd.DataFrame, ppr: bool, year: int, cache_key: str) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    prefix = _get_cache_prefix(ppr, year)
+    cache_file = os.path.join(CACHE_DIR, f"{prefix}{cache_key}.parquet")
+    # remove stale cache files for this year and scoring type, another process may be
+    # removing them at the same time
+    for file_name in os.listdir(CACHE_DIR):
+        file_path = os.path.join(CACHE_DIR, file_name)
+        if (
+            file_name.startswith(prefix)
+            and file_name.endswith(".parquet")
+            and file_path != cache_file
+        ):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(file_path)
+    # another process already finished the same cache
+    if os.path.exists(cache_file):
+        return
+    # write to a temp file first so a crash never leaves a half written cache. Every
+    # writer uses its own temp file, so processes can build the same cache at once
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_file)
+    os.replace(tmp_file, cache_file)
+
+
+def clear_cache() -> None:
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for file_name in os.listdir(CACHE_DIR):
+        if file_name.endswith((".parquet", ".npz", ".npy", ".json", ".tmp")):
+            os.remove(os.path.join(CACHE_DIR, file_name))
+        elif file_name.startswith(STACKED_CACHE_PREFIX):
+            shutil.rmtree(os.path.join(CACHE_DIR, file_name))
+
+
+def _is_source_column(column: str, columns: typing.List[str]) -> bool:
+    # whether a master sheet column is needed to build any of the requested columns.
+    # Follows the renames below: STANDARD_ADP becomes ADP, PPR_X replaces X for ppr,
+    # and X fills PPR_X for QBs, Ks and DEFs. The name, position and team are always
+    # needed for the player ids
+    if column in STRING_COLUMNS or column in columns:
+        return True
+    if column == "STANDARD_ADP":
+        return "ADP" in columns
+    return column.replace("PPR_", "") in columns
+
+
+def _build_master_df(
+    ppr: bool, year: int, columns: typing.Optional[typing.List[str]] = None
+) -> pd.DataFrame:
+    source_files = _get_source_files(ppr, year)
+    with stage("read_master_csv") as timed:
+        df = pd.read_csv(
+            source_files[0],
+            dtype={col: str for col in STRING_COLUMNS},
+            usecols=(lambda col: _is_source_column(col, columns)) if columns else None,
+        )
+        timed.set_shape(df)
+    with stage("coerce_column_types") as timed:
+        df = _coerce_column_types(df)
+        timed.set_shape(df)
     df = _fix_standard_adp(df)
+    # drop any rows where POS is NaN
+    df = df[df["POS"].notna()]
+    with stage("add_player_ids") as timed:
+        df = add_player_ids(df)
+        timed.set_shape(df)
 
-    final_ppg_file = os.path.join(
-        current_dir, "data", f"fp_converted_names{PPR_STRING}{YEAR_STRING}.csv"
-    )
-    if os.path.exists(final_ppg_file):
-        finish_df = pd.read_csv(final_ppg_file)
-        master_df = add_final_finish_to_old_df(df, finish_df)
+    if len(source_files) > 1:
+        with stage("read_finish_csv") as timed:
+            finish_df = pd.read_csv(
+                source_files[1], usecols=["Player", "Pos", "Team", "AVG"]
+            )
+            timed.set_shape(finish_df)
+        with stage("add_final_finish") as timed:
+            master_df = add_final_finish_to_old_df(df, finish_df)
+            timed.set_shape(master_df)
     else:
         master_df = df
 
-    # drop any rows where POS is NaN
-    master_df = master_df[master_df["POS"].notna()]
-    master_df = master_df.replace("%", "", regex=True)
+    with stage("reshape_ppr_columns") as timed:
+        if ppr:
+            master_df = _set_ppr_columns_for_non_ppr_positions(master_df)
+            master_df = _remove_standard_columns(master_df)
+            master_df = _remove_ppr_from_column_names(master_df)
+        else:
+            master_df = _remove_ppr_columns(master_df)
+        timed.set_shape(master_df)
 
-    if ppr:
-        master_df = _set_ppr_columns_for_non_ppr_positions(master_df)
-        master_df = _remove_standard_columns(master_df)
-        master_df = _remove_ppr_from_column_names(master_df)
-    else:
-        master_df = _remove_ppr_columns(master_df)
+    return master_df[columns] if columns else master_df
+
+
+def get_master_df(
+    ppr: bool,
+    year: int,
+    use_cache: bool = True,
+    columns: typing.Optional[typing.List[str]] = None,
+) -> pd.DataFrame:
+    # columns limits the frame to those prepared columns, in that order. Only the
+    # master sheet columns they are built from are parsed, or only they are read from
+    # the cache. Raises KeyError for columns the year doesn't have
+    if not use_cache:
+        return _build_master_df(ppr, year, columns)
+
+    # the prepared frame is cached as parquet, keyed on the source files and schema version
+    cache_key = get_data_version(ppr, year)
+    cache_file = os.path.join(
+        CACHE_DIR, f"{_get_cache_prefix(ppr, year)}{cache_key}.parquet"
+    )
+    if os.path.exists(cache_file):
+        if columns:
+            missing = set(columns) - set(pq.read_schema(cache_file).names)
+            if missing:
+                raise KeyError(f"{sorted(missing)} not in the {year} master sheet")
+        with stage("read_master_cache") as timed:
+            master_df = pd.read_parquet(cache_file, columns=columns)
+            timed.set_shape(master_df)
+        return master_df
+
+    # every column is cached so later calls can read any of them
+    master_df = _build_master_df(ppr, year)
+    _write_cache(master_df, ppr, year, cache_key)
+    return master_df[columns] if columns else master_df
+
+
+# columns the stacked frame and its parquet dataset are partitioned on
+STACK_KEYS = ["year", "scoring", "POS"]
+SCORINGS = ["ppr", "standard"]
+# POS keeps the same categories whichever partitions are read
+STACK_POSITIONS = ["DEF", "K", "QB", "RB", "TE", "UNKNOWN", "WR"]
+STACKED_CACHE_PREFIX = "stacked_"
+
+
+def get_available_years() -> typing.List[int]:
+    # every year with a master sheet, newest first
+    years = []
+    for file_name in os.listdir(DATA_DIR):
+        match = re.fullmatch(r"master_sheet_(\d+)\.csv", file_name)
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years, reverse=True)
+
+
+def get_stacked_data_version() -> str:
+    # changes whenever any input file of any year or scoring type changes
+    return _get_cache_key(
+        [
+            file_path
+            for year in get_available_years()
+            for ppr in [True, False]
+            for file_path in _get_source_files(ppr, year)
+        ]
+    )
+
+
+def _set_stack_key_types(df: pd.DataFrame, years: typing.List[int]) -> pd.DataFrame:
+    # categorical keys first, rows sorted by them so every partition is contiguous
+    df["year"] = pd.Categorical(df["year"].astype(int), categories=sorted(years))
+    df["scoring"] = pd.Categorical(df["scoring"].astype(str), categories=SCORINGS)
+    positions = sorted(set(STACK_POSITIONS) | set(df["POS"].astype(str)))
+    df["POS"] = pd.Categorical(df["POS"].astype(str), categories=positions)
+    columns = STACK_KEYS + [col for col in df.columns if col not in STACK_KEYS]
+    df = df[columns].sort_values(by=STACK_KEYS, kind="stable")
+    return df.reset_index(drop=True)
+
+
+def _build_stacked_df(years: typing.List[int]) -> pd.DataFrame:
+    frames = []
+    for year in years:
+        for scoring in SCORINGS:
+            df = get_master_df(ppr=scoring == "ppr", year=year)
+            frames.append(df.assign(year=year, scoring=scoring))
+    # columns missing from a season are NaN in its rows
+    return _set_stack_key_types(pd.concat(frames, ignore_index=True), years)
+
+
+def _write_stacked_dataset(stacked_df: pd.DataFrame, dataset_dir: str) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # remove finished datasets of other data versions. Temp directories belong to
+    # builders that are still writing, and the current version may already be done
+    for file_name in os.listdir(CACHE_DIR):
+        file_path = os.path.join(CACHE_DIR, file_name)
+        if (
+            file_name.startswith(STACKED_CACHE_PREFIX)
+            and not file_name.endswith(".tmp")
+            and file_path != dataset_dir
+        ):
+            shutil.rmtree(file_path, ignore_errors=True)
+    if os.path.isdir(dataset_dir):
+        return
+    # write to a temp directory first so a crash never leaves a half written dataset.
+    # Every builder uses its own, so processes can build the same dataset at once
+    tmp_dir = f"{dataset_dir}.{os.getpid()}.tmp"
+    stacked_df.to_parquet(tmp_dir, partition_cols=STACK_KEYS)
+    try:
+        os.replace(tmp_dir, dataset_dir)
+    except OSError:
+        # another process finished the same dataset first, directories can't be
+        # replaced once they have files in them
+        if not os.path.isdir(dataset_dir):
+            raise
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def get_stacked_df(
+    years: typing.Optional[typing.List[int]] = None,
+    scorings: typing.Optional[typing.List[str]] = None,
+    positions: typing.Optional[typing.List[str]] = None,
+    use_cache: bool = True,
+) -> pd.DataFrame:
+    # every season and scoring type in one long frame with categorical year, scoring
+    # and POS columns, so a single groupby covers every season
+    available_years = get_available_years()
+    filters = [
+        (key, "in", values)
+        for key, values in zip(STACK_KEYS, [years, scorings, positions])
+        if values is not None
+    ]
+    if not use_cache:
+        df = _build_stacked_df(available_years)
+        for key, _, values in filters:
+            df = df[df[key].isin(values)]
+        return df.reset_index(drop=True)
+
+    # cached as a parquet dataset partitioned on the stack keys, keyed on every source file
+    dataset_dir = os.path.join(
+        CACHE_DIR, f"{STACKED_CACHE_PREFIX}{get_stacked_data_version()}"
+    )
+    if not os.path.isdir(dataset_dir):
+        _write_stacked_dataset(_build_stacked_df(available_years), dataset_dir)
 
-    return master_df
+    # only the partitions that pass the filters are read
+    df = pd.read_parquet(dataset_dir, filters=filters or None)
+    return _set_stack_key_types(df, available_years)
@@ -0,0 +1,112 @@
+import contextlib
+import os
+import typing
+
+import numpy as np
+import pandas as pd
+
+import utilities
+from player_index import get_player_ids
+from utilities import get_data_version
+
+WEEKS = list(range(1, 19))
+WEEK_COLUMNS = [str(week) for week in WEEKS]
+
+
+class WeeklyPoints(typing.NamedTuple):
+    player_ids: np.ndarray  # int32, same ids as PLAYER_ID in the master frame
+    names: np.ndarray
+    positions: np.ndarray
+    # float32 (players x weeks), NaN for byes and missed games
+    points: np.ndarray
+    # uint32 bitmask per player, bit (week - 1) is set when the player played that week
+    played: np.ndarray
+
+
+def _get_finish_file(ppr: bool, year: int) -> str:
+    ppr_string = "ppr" if ppr else "standard"
+    return os.path.join(
+        utilities.DATA_DIR, f"fp_converted_names_{ppr_string}_{year}.csv"
+    )
+
+
+def _build_weekly_points(ppr: bool, year: int) -> WeeklyPoints:
+    # BYE, "-" and blank cells are parsed straight to NaN by the csv reader
+    df = pd.read_csv(_get_finish_file(ppr, year), na_values=["BYE", "-"])
+    points = df[WEEK_COLUMNS].to_numpy(dtype=np.float32)
+    week_bits = np.left_shift(np.uint32(1), np.arange(len(WEEKS), dtype=np.uint32))
+    played = np.bitwise_or.reduce(
+        np.where(np.isnan(points), np.uint32(0), week_bits), axis=1
+    ).astype(np.uint32)
+    player_ids = get_player_ids(df["Player"], df["Pos"], df["Team"])
+    return WeeklyPoints(
+        player_ids=player_ids.astype(np.int32),
+        names=df["Player"].to_numpy(dtype=str),
+        positions=df["Pos"].replace({"DST": "DEF"}).to_numpy(dtype=str),
+        points=points,
+        played=played,
+    )
+
+
+def get_weekly_points(ppr: bool, year: int, use_cache: bool = True) -> WeeklyPoints:
+    if not use_cache:
+        return _build_weekly_points(ppr, year)
+
+    # cached as .npz next to the master frame cache, keyed on the same data version
+    ppr_string = "ppr" if ppr else "standard"
+    prefix = f"weekly_{year}_{ppr_string}_"
+    cache_file = os.path.join(
+        utilities.CACHE_DIR, f"{prefix}{get_data_version(ppr, year)}.npz"
+    )
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as cached:
+            return WeeklyPoints(
+                **{field: cached[field] for field in WeeklyPoints._fields}
+            )
+
+    weekly_points = _build_weekly_points(ppr, year)
+    os.makedirs(utilities.CACHE_DIR, exist_ok=True)
+    # remove stale cache files for this year and scoring type, another process may be
+    # removing them at the same time
+    for file_name in os.listdir(utilities.CACHE_DIR):
+        file_path = os.path.join(utilities.CACHE_DIR, file_name)
+        if (
+            file_name.startswith(prefix)
+            and file_name.endswith(".npz")
+            and ".tmp" not in file_name
+            and file_path != cache_file
+        ):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(file_path)
+    if os.path.exists(cache_file):
+        return weekly_points
+    # write to a temp file first so a crash never leaves a half written cache. Every
+    # writer uses its own temp file, so processes can build the same cache at once
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_file, **weekly_points._asdict())
+    os.replace(tmp_file, cache_file)
+    return weekly_points
+
+
+def get_games_played(weekly_points: WeeklyPoints) -> np.ndarray:
+    return np.bitwise_count(weekly_points.played)
+
+
+def get_window_ppg(
+    points: np.ndarray, windows: typing.List[typing.Tuple[int, int]]
+) -> np.ndarray:
+    # PPG over the games played in each inclusive (start week, end week) window,
+    # (players x windows). Computed from running sums so every window costs the same
+    played = ~np.isnan(points)
+    zero_padding = np.zeros((points.shape[0], 1))
+    point_sums = np.hstack(
+        [zero_padding, np.cumsum(np.where(played, points, 0), axis=1)]
+    )
+    game_sums = np.hstack([zero_padding, np.cumsum(played, axis=1)])
+    starts = np.array([start - 1 for start, _ in windows])
+    ends = np.array([end for _, end in windows])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (
+            (point_sums[:, ends] - point_sums[:, starts])
+            / (game_sums[:, ends] - game_sums[:, starts])
+        ).astype(np.float32)